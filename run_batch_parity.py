@@ -0,0 +1,114 @@
+import random
+import sys
+import time
+
+import numpy as np
+
+from src.batch import BatchGame, NO_INPUT
+from src.game import Game
+from src.utils.config import Config, Player
+from src.utils.direction import Direction
+from src.utils.tiles import Tiles
+
+TILES_X = 30
+TILES_Y = 30
+GAME_SIZE_PX = 900  # nominal pixel size (only affects bullet positions)
+DT_MS = [8, 8, 16, 33, 50]  # simulated milliseconds per tick (random)
+TURN_CHANCE = 0.05  # chance of a random turn per game and tick
+BOOST_CHANCE = 0.01  # chance of pressing or releasing boost
+KEYS = {Direction.UP.value: 1000, Direction.DOWN.value: 1001,
+        Direction.LEFT.value: 1002, Direction.RIGHT.value: 1003}
+BOOST_KEY = 1005
+
+
+def get_config() -> Config:
+    # One player with the keys above (and shoot and pause keys unused)
+    cfg = Config('config_default.ini')
+    cfg.read()
+    cfg.players = [Player('Player 1', {1000}, {1001}, {1002}, {1003},
+                          {1004}, {BOOST_KEY}, {1006})]
+    cfg.all_keys = cfg.players[0].all_keys
+    return cfg
+
+
+def get_state(game: Game) -> tuple:
+    snake = game.all_snakes[0]
+    return (list(snake.coords), game.apple, game.pow_shield, game.pow_ghost,
+            game.pow_bomb, game.pow_bullets, list(game.enemies),
+            list(game.poisons), game.level, game.game_over, snake.ghost_ms,
+            snake.is_shield_on, snake.bullets, snake.max_length_reached,
+            snake.direction.value)
+
+
+def get_batch_state(batch: BatchGame, i: int) -> tuple:
+    to_coords = batch.to_coords
+    return (batch.snake_coords(i), to_coords(batch.apple[i]),
+            to_coords(batch.pow_shield[i]), to_coords(batch.pow_ghost[i]),
+            to_coords(batch.pow_bomb[i]), to_coords(batch.pow_bullets[i]),
+            [to_coords(e) for e in batch.enemies[i]],
+            [to_coords(p) for p in batch.poisons[i]], int(batch.level[i]),
+            bool(batch.game_over[i]), float(batch.ghost_ms[i]),
+            bool(batch.is_shield_on[i]), int(batch.bullets[i]),
+            int(batch.max_length_reached[i]), int(batch.direction[i]))
+
+
+def same_free_tiles(game: Game, batch: BatchGame, i: int) -> bool:
+    # Same order too, as free tiles are picked by index
+    n = game.free_tiles.count
+    return n == batch.no_of_free_tiles[i] and \
+        (game.free_tiles.tiles[:n] == batch.free_tiles[i, :n]).all()
+
+
+if __name__ == '__main__':
+    # python run_batch_parity.py [number of games] [ticks] [first seed]
+    # Steps Game and BatchGame side by side with the same seeds and random
+    # inputs and checks that every game's state matches after every tick
+    no_of_games = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 6000
+    first_seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+
+    tiles = Tiles((GAME_SIZE_PX, GAME_SIZE_PX), (TILES_X, TILES_Y))
+    cfg = get_config()
+    seeds = list(range(first_seed, first_seed + no_of_games))
+    games = [Game(tiles, cfg, (TILES_X, TILES_Y), seed) for seed in seeds]
+    batch = BatchGame(tiles, seeds)
+    rand = random.Random(0)  # inputs
+    boost = np.zeros(no_of_games, bool)
+
+    start = time.perf_counter()
+    for tick in range(ticks):
+        dt = rand.choice(DT_MS)
+        directions = np.full(no_of_games, NO_INPUT)
+        new_boost = boost.copy()
+        for i, game in enumerate(games):
+            if rand.random() < TURN_CHANCE:
+                directions[i] = rand.choice(list(KEYS))
+            if rand.random() < BOOST_CHANCE:
+                new_boost[i] = not boost[i]
+            if game.game_over:
+                continue
+            inputs = []
+            if directions[i] != NO_INPUT:
+                inputs.append((KEYS[int(directions[i])], True))
+            if new_boost[i] != boost[i]:
+                inputs.append((BOOST_KEY, bool(new_boost[i])))
+            game.step(dt, inputs)
+        boost = new_boost
+        batch.step(dt, directions, boost)
+
+        for i, game in enumerate(games):
+            expected, got = get_state(game), get_batch_state(batch, i)
+            if expected != got or \
+                    (not game.game_over and
+                     not same_free_tiles(game, batch, i)):
+                print('MISMATCH in game {} (seed {}) at tick {}'
+                      ''.format(i, seeds[i], tick + 1))
+                print('Game:      {}'.format(expected))
+                print('BatchGame: {}'.format(got))
+                sys.exit(1)
+    elapsed = time.perf_counter() - start
+
+    print('OK: {} games matched for {} ticks in {:.2f}s ({} over, max '
+          'level {})'.format(no_of_games, ticks, elapsed,
+                             int(batch.game_over.sum()),
+                             max(game.level for game in games)))
@@ -0,0 +1,320 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List
+
+# Renderer benchmarks need no display or audio device
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame as pg
+
+from src.game import Game
+from src.snake import Snake
+from src.snapshot import get_snapshot, encode_snapshot, decode_snapshot, \
+    get_delta, apply_delta, restore
+from src.utils.config import Config, Player, NATIVE_WINDOW_SIZES
+from src.utils.direction import Direction
+from src.utils.tiles import Tiles
+
+TILES_X = 30
+TILES_Y = 30
+GAME_SIZE_PX = 900  # for engine benchmarks (only affects bullet positions)
+WIDTH_STRETCH = 1.4  # for HUD area (as in run_game.py)
+RESCALED_WINDOW_SIZE = 1000  # drawn with images rescaled on loading
+LARGE_BOARD_TILES = 1000  # tiles per side of a board bigger than the view
+REPEATS = 5  # timed rounds per benchmark (median and min are reported)
+# Approx. seconds per timed round (can be lowered for a quick run)
+ROUND_S = float(os.environ.get('BENCH_ROUND_S', '0.2'))
+SEED = 1
+SLOWER = 1.1  # ratio above which --compare reports a regression
+
+
+def get_config(no_of_players: int, window_size: int = GAME_SIZE_PX) \
+        -> Config:
+    # Default config with the given number of players (distinct keys)
+    cfg = Config('config_default.ini')
+    cfg.read()
+    cfg.players = []
+    for i in range(no_of_players):
+        k = 1000 + 10 * i
+        cfg.players.append(Player('Player {}'.format(i + 1), {k}, {k + 1},
+                                  {k + 2}, {k + 3}, {k + 4}, {k + 5},
+                                  {k + 6}))
+    cfg.all_keys = set().union(*[p.all_keys for p in cfg.players])
+    cfg.window_size = cfg.width_px = cfg.height_px = window_size
+    return cfg
+
+
+def get_game(no_of_players: int, level: int, tiles: Tiles = None) -> Game:
+    # Game at the given level with all skulls spawned; snakes are ghosts
+    # for good so that they never die while being benchmarked
+    if tiles is None:
+        tiles = Tiles((GAME_SIZE_PX, GAME_SIZE_PX), (TILES_X, TILES_Y))
+    game = Game(tiles, get_config(no_of_players),
+                (tiles.tiles_x, tiles.tiles_y), SEED)
+    game.level = level
+    game.new_objects()
+    for s in game.live_snakes:
+        s.set_ghost(float('inf'))
+    return game
+
+
+def grow(game: Game, snake: Snake, length: int) -> None:
+    while len(snake) < length:
+        snake.grow_by_one()
+        game.occupy_segment(snake.tip)
+
+
+def setup_snake_move(length: int) -> Callable[[], None]:
+    game = get_game(1, 1)
+    snake = game.live_snakes[0]
+    grow(game, snake, length)
+    return snake.move
+
+
+def setup_game_move(players: int, level: int, board_tiles: int = TILES_X) \
+        -> Callable[[], None]:
+    # Every snake moves (and is checked for hits) on every call
+    game = get_game(players, level, Tiles(
+        (GAME_SIZE_PX * board_tiles // TILES_X,) * 2, (board_tiles,) * 2))
+    for i, s in enumerate(game.live_snakes):
+        s.turns.append([Direction.UP, Direction.LEFT][i % 2])
+    dt = max(s.ms_per_move for s in game.live_snakes)
+    return lambda: game.move(dt)
+
+
+def setup_new_objects(level: int) -> Callable[[], None]:
+    game = get_game(1, level)
+    return game.new_objects
+
+
+def setup_check_snake_hits(players: int, length: int) \
+        -> Callable[[], None]:
+    # Heads on empty tiles (the common case) of snakes that are not ghosts
+    game = get_game(players, 1)
+    for i, s in enumerate(game.live_snakes):
+        s.turns.append(Direction.DOWN)
+        for _ in range(i * 2):
+            s.move()
+        grow(game, s, length)
+        s.set_ghost(0)
+    snakes = game.live_snakes
+    return lambda: [game.check_snake_hits(s) for s in snakes]
+
+
+def setup_check_bullet_hits(bullets: int) -> Callable[[], None]:
+    # Bullets flying across a level 60 board, topped up as they hit things
+    # or leave the screen; each call moves them and checks for hits
+    game = get_game(1, 60)
+    util = game.util
+    directions = list(Direction)
+    pool = game.fired_bullets
+
+    def step():
+        while len(pool) < bullets:
+            i = len(pool)
+            tile = (i * 7 % TILES_X, i * 13 % TILES_Y)
+            pool.fire(util.get_xy_center(tile), directions[i % 4])
+        pool.remove(pool.get_out_of_screen())
+        pool.move(8)
+        game.check_bullet_hits()
+    return step
+
+
+def setup_snapshot(op: str) -> Callable[[], None]:
+    # Two player level 20 game with bullets flying; deltas are between two
+    # consecutive 16 ms ticks
+    game = get_game(2, 20)
+    for s in game.live_snakes:
+        for d in Direction:
+            game.fired_bullets.fire(game.util.get_xy_center(s.head), d)
+    old = get_snapshot(game)
+    game.step(16)
+    new = get_snapshot(game)
+    data = encode_snapshot(new)
+    delta = get_delta(old, new)
+    return {
+        'encode': lambda: encode_snapshot(get_snapshot(game)),
+        'decode': lambda: decode_snapshot(data),
+        'delta': lambda: get_delta(old, new),
+        'apply_delta': lambda: apply_delta(old, delta),
+        'restore': lambda: restore(game, new),
+    }[op]
+
+
+def setup_draw_game(window_size: int, dirty_rects: bool,
+                    board_tiles: int = TILES_X) -> Callable[[], None]:
+    # Drawing a two player level 30 game which moves between frames (the
+    # 16 ms step is timed too, but is small next to the drawing); boards
+    # bigger than TILES_X are drawn through a TILES_X wide view
+    from src.drawer import Drawer
+    from src.utils.img import ImgHolder
+    from src.utils.text import Text
+    from src.utils.util import Util
+
+    cfg = get_config(2, window_size)
+    cfg.dirty_rects = dirty_rects
+    util = Util((window_size, window_size), (board_tiles, board_tiles),
+                'img/', 'sfx/', None, (TILES_X, TILES_Y))
+    screen = pg.display.set_mode((int(window_size * WIDTH_STRETCH),
+                                  window_size))
+    img = ImgHolder(util)
+    img.post_init()
+    drawer = Drawer(util, img, Text(cfg, util), cfg)
+    game = get_game(2, 30, util)
+    for s in game.live_snakes:
+        grow(game, s, 20)
+        s.add_bullets(1000)
+    frame = 0
+
+    def draw():
+        nonlocal frame
+        frame += 1
+        if frame % 20 == 0:  # keep some bullets in flight
+            game.press_key(1006)
+        game.step(16)
+        drawer.draw_game(screen, game, 16)
+        drawer.pop_dirty_rects()
+    return draw
+
+
+def get_benchmarks() -> List[tuple]:
+    # (name, parameters, setup)
+    benchmarks = []
+    for length in [3, 100, 800]:
+        benchmarks.append(('snake_move', {'length': length},
+                           lambda length=length: setup_snake_move(length)))
+    for players in [1, 2, 4]:
+        for level in [1, 20, 60]:
+            benchmarks.append(('game_move',
+                               {'players': players, 'level': level},
+                               lambda players=players, level=level:
+                               setup_game_move(players, level)))
+    benchmarks.append(('game_move', {'players': 1, 'level': 60,
+                                     'board_tiles': LARGE_BOARD_TILES},
+                       lambda: setup_game_move(1, 60, LARGE_BOARD_TILES)))
+    for level in [1, 20, 60, 200]:
+        benchmarks.append(('new_objects', {'level': level},
+                           lambda level=level: setup_new_objects(level)))
+    for players in [1, 4]:
+        for length in [3, 200]:
+            benchmarks.append(('check_snake_hits',
+                               {'players': players, 'length': length},
+                               lambda players=players, length=length:
+                               setup_check_snake_hits(players, length)))
+    for bullets in [1, 100, 1000]:
+        benchmarks.append(('check_bullet_hits', {'bullets': bullets},
+                           lambda b=bullets: setup_check_bullet_hits(b)))
+    for op in ['encode', 'decode', 'delta', 'apply_delta', 'restore']:
+        benchmarks.append(('snapshot', {'op': op},
+                           lambda o=op: setup_snapshot(o)))
+    for window_size in NATIVE_WINDOW_SIZES + [RESCALED_WINDOW_SIZE]:
+        for dirty_rects in [False, True]:
+            benchmarks.append(('draw_game',
+                               {'window_size': window_size,
+                                'dirty_rects': dirty_rects},
+                               lambda w=window_size, d=dirty_rects:
+                               setup_draw_game(w, d)))
+    for dirty_rects in [False, True]:
+        benchmarks.append(('draw_game',
+                           {'window_size': GAME_SIZE_PX,
+                            'dirty_rects': dirty_rects,
+                            'board_tiles': LARGE_BOARD_TILES},
+                           lambda d=dirty_rects: setup_draw_game(
+                               GAME_SIZE_PX, d, LARGE_BOARD_TILES)))
+    return benchmarks
+
+
+def measure(fn: Callable[[], None]) -> Dict[str, float]:
+    # Calls per round chosen so that a round takes about ROUND_S
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed > ROUND_S / 10:
+            break
+        number *= 10
+    number = max(1, int(number * ROUND_S / elapsed))
+
+    per_call_us = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        per_call_us.append((time.perf_counter() - start) / number * 1e6)
+    return {'median_us': statistics.median(per_call_us),
+            'min_us': min(per_call_us), 'calls_per_round': number}
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(only: str = '') -> dict:
+    pg.init()
+    results = []
+    for name, params, setup in get_benchmarks():
+        if only and only != name:
+            continue
+        result = {'name': name, 'params': params}
+        result.update(measure(setup()))
+        results.append(result)
+        print('{:<18} {:<40} {:>12.2f} us'.format(
+            name, json.dumps(params), result['median_us']), file=sys.stderr)
+    return {'commit': get_commit(), 'python': platform.python_version(),
+            'pygame': pg.version.ver, 'platform': platform.platform(),
+            'results': results}
+
+
+def compare(old_file: str, new_file: str) -> bool:
+    # Prints new/old median ratios; False if anything got slower
+    with open(old_file) as f:
+        old = json.load(f)
+    with open(new_file) as f:
+        new = json.load(f)
+    old_results = {(r['name'], json.dumps(r['params'], sort_keys=True)): r
+                   for r in old['results']}
+    ok = True
+    print('{} -> {}'.format(old['commit'], new['commit']))
+    for r in new['results']:
+        key = (r['name'], json.dumps(r['params'], sort_keys=True))
+        if key not in old_results:
+            continue
+        ratio = r['median_us'] / old_results[key]['median_us']
+        slower = ratio > SLOWER
+        ok = ok and not slower
+        print('{:<18} {:<40} {:>6.2f}x{}'.format(
+            key[0], key[1], ratio, '  SLOWER' if slower else ''))
+    return ok
+
+
+if __name__ == '__main__':
+    # python run_benchmarks.py [results.json] [--only <name>]
+    # python run_benchmarks.py --compare <old.json> <new.json>
+    args = sys.argv[1:]
+    if args[:1] == ['--compare'] and len(args) == 3:
+        sys.exit(0 if compare(args[1], args[2]) else 1)
+
+    only = ''
+    if '--only' in args:
+        i = args.index('--only')
+        only = args[i + 1]
+        del args[i:i + 2]
+    report = run(only)
+    if args:
+        with open(args[0], 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
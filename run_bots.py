@@ -0,0 +1,76 @@
+import asyncio
+import random
+import sys
+import time
+
+from src.net import DEFAULT_PORT, MSG_JOIN, MSG_START, MSG_KEY, MSG_STEP, \
+    MSG_DIGEST, VERSION, KEY, PROTOCOL_VERSION, ACTION_PAUSE, \
+    NO_OF_ACTIONS, Client, encode
+from src.server import read_message
+
+BOTS = 48
+DURATION_S = 30
+KEY_PRESS_CHANCE = 0.05  # chance of a random key press per tick received
+MAX_SERVER_MESSAGE_SIZE = 1 << 28  # bytes (not limited like clients' ones)
+
+
+class Stats:
+    def __init__(self):
+        self.games = 0
+        self.ticks = 0
+        self.digests = 0  # checked (a mismatch raises)
+        self.max_gap_s = 0.0  # longest wait for a tick during a game
+
+
+async def run_bot(i: int, host: str, port: int, end: float, stats: Stats):
+    # Join games and press random keys until time is up, keeping a copy of
+    # each game in step with the server's
+    actions = [a for a in range(NO_OF_ACTIONS) if a != ACTION_PAUSE]
+    while time.perf_counter() < end:
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(encode(MSG_JOIN, VERSION.pack(PROTOCOL_VERSION) +
+                            'Bot {}'.format(i).encode()))
+        msg_type, payload = await read_message(
+            reader, MAX_SERVER_MESSAGE_SIZE)
+        if msg_type != MSG_START:
+            raise Exception('Server did not start a game')
+        client = Client(payload)
+        stats.games += 1
+
+        last_tick = time.perf_counter()
+        while not client.game.game_over and time.perf_counter() < end:
+            msg_type, payload = await read_message(
+                reader, MAX_SERVER_MESSAGE_SIZE)
+            client.apply(msg_type, payload)
+            if msg_type == MSG_STEP:
+                now = time.perf_counter()
+                stats.ticks += 1
+                stats.max_gap_s = max(stats.max_gap_s, now - last_tick)
+                last_tick = now
+                if random.random() < KEY_PRESS_CHANCE:
+                    writer.write(encode(MSG_KEY, KEY.pack(
+                        random.choice(actions), True)))
+            elif msg_type == MSG_DIGEST:
+                stats.digests += 1
+        writer.close()
+
+
+async def main(bots: int, host: str, port: int, duration_s: float):
+    stats = Stats()
+    start = time.perf_counter()
+    await asyncio.gather(*[run_bot(i, host, port, start + duration_s, stats)
+                           for i in range(bots)])
+    elapsed = time.perf_counter() - start
+    print('{} bots played {} games: {:.1f} ticks/s per bot, {} digests '
+          'matched, longest wait for a tick {:.1f} ms'.format(
+              bots, stats.games, stats.ticks / bots / elapsed,
+              stats.digests, stats.max_gap_s * 1000))
+
+
+if __name__ == '__main__':
+    # python run_bots.py [bots] [seconds] [host] [port]
+    args = sys.argv[1:]
+    asyncio.run(main(int(args[0]) if len(args) > 0 else BOTS,
+                     args[2] if len(args) > 2 else 'localhost',
+                     int(args[3]) if len(args) > 3 else DEFAULT_PORT,
+                     float(args[1]) if len(args) > 1 else DURATION_S))
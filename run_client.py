@@ -0,0 +1,52 @@
+import sys
+from typing import Tuple
+
+from src.net import DEFAULT_PORT, Connection, RemoteGame
+from src.utils.config import Config
+from run_game import start, VIEW_TILES_X
+
+if __name__ == '__main__':
+    # python run_client.py [--watch] [host] [port]
+    args = [arg for arg in sys.argv[1:] if arg != '--watch']
+    watching = '--watch' in sys.argv
+    host = args[0] if len(args) > 0 else 'localhost'
+    port = int(args[1]) if len(args) > 1 else DEFAULT_PORT
+
+    # The first player in the config plays (with their name and keys),
+    # unless only watching
+    cfg = Config('config.ini')
+    cfg.read()
+    player = cfg.players[0]
+
+    def join() -> Tuple[Connection, RemoteGame]:
+        connection = Connection(host, port)
+        if watching:
+            print('Waiting for a game to watch...')
+            return connection, connection.watch()
+        print('Waiting for other players...')
+        return connection, connection.join(player.name)
+
+    connection, client = join()
+
+    # Window sized so that the board is as big in pixels as on the server
+    # (which the bullets move by)
+    tiles = client.game.util
+    window_size = tiles.width_px * min(VIEW_TILES_X, tiles.tiles_x) \
+        // tiles.tiles_x
+    screen, cfg, util, scores, loop = start(window_size=window_size)
+    if (util.tiles_x, util.tiles_y, util.width_px) != \
+            (tiles.tiles_x, tiles.tiles_y, tiles.width_px):
+        raise Exception('Board size differs from the server\'s')
+
+    running = True
+    while running:
+        client.bind_keys(player)
+        connection.start_reading()
+        running = loop.main_remote(screen, client, connection)
+        connection.close()
+
+        # Game over sequence, then join (or watch) another game on restart
+        if running:
+            running = loop.game_over(screen, client.game, scores)
+        if running:
+            connection, client = join()
@@ -1,3 +1,9 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional, Tuple
+
 import pygame as pg
 
 from src.drawer import Drawer
@@ -7,54 +13,121 @@ from src.utils.img import ImgHolder
 from src.utils.score import ScoresList
 from src.utils.sfx import SfxHolder
 from src.utils.text import Text
+from src.utils.timings import FrameTimings
 from src.utils.util import Util
 from src.loop import Loop
+from src.replay import Recorder
+from src.snapshot import save, load, restore
 
-TILES_X = 30  # number of tiles horizontally (should not be changed)
-TILES_Y = 30  # number of tiles vertically (should not be changed)
+TILES_X = 30  # number of tiles on the board horizontally
+TILES_Y = 30  # number of tiles on the board vertically
+VIEW_TILES_X = 30  # tiles shown at once (images are made for 30 across);
+VIEW_TILES_Y = 30  # the view follows the snakes on bigger boards
 WIDTH_STRETCH = 1.4  # for HUD area
 
 GAME_TITLE = 'PySnake'
 GAME_ICON = 'img/icon.png'
 IMG_FOLDER = 'img/'
+IMG_CACHE_FOLDER = 'cache/img/'  # images rescaled for other window sizes
 SFX_FOLDER = 'sfx/'
+LOADING_THREADS = 4  # for decoding images and sounds (0 to load in turn)
+REPLAY_FOLDER = 'replays/'  # games are recorded here when run with --record
 
-# Initialise all imported pygame modules and clock
-pg.mixer.pre_init(44100, -16, 2, 1024)
-pg.init()
-
-# Initialise helper components
-CFG = Config('config.ini')
-CFG.read()  # read config
-SCORES = ScoresList('highscores')
-SCORES.read()
-UTIL = Util((CFG.width_px, CFG.height_px), (TILES_X, TILES_Y),
-            IMG_FOLDER, SFX_FOLDER)
-IMG = ImgHolder(UTIL)
-SFX = SfxHolder(UTIL)
-TXT = Text(CFG, UTIL)
 
-if __name__ == '__main__':
-    # Initialise game drawer and game loop
-    DRAWER = Drawer(UTIL, IMG, TXT, CFG)
-    LOOP = Loop(UTIL, CFG, SFX, TXT, DRAWER)
+def start(loading_threads: int = LOADING_THREADS,
+          window_size: Optional[int] = None) \
+        -> Tuple[pg.Surface, Config, Util, ScoresList, Loop]:
+    # Initialise all imported pygame modules
+    pg.mixer.pre_init(44100, -16, 2, 1024)
+    pg.init()
+
+    # Start loading assets, then do the rest of the set-up meanwhile
+    cfg = Config('config.ini')
+    cfg.read()  # read config
+    if window_size is not None:
+        cfg.window_size = cfg.width_px = cfg.height_px = window_size
+    pool = ThreadPoolExecutor(loading_threads) if loading_threads else None
+    util = Util((cfg.width_px, cfg.height_px), (TILES_X, TILES_Y),
+                IMG_FOLDER, SFX_FOLDER, IMG_CACHE_FOLDER,
+                (VIEW_TILES_X, VIEW_TILES_Y))
+    img = ImgHolder(util, pool)
+    sfx = SfxHolder(util, pool)
+    scores = ScoresList('highscores')
+    scores.read()
+    txt = Text(cfg, util)
 
     # Set title and icon
     pg.display.set_caption(GAME_TITLE)
-    pg.display.set_icon(IMG.game_icon)
+    pg.display.set_icon(img.game_icon)
 
     # Create screen (width stretched for HUD area)
     screen: pg.Surface = pg.display.set_mode(
-        (int(CFG.width_px * WIDTH_STRETCH), CFG.height_px),
-        pg.FULLSCREEN if CFG.full_screen else 0)
-    IMG.post_init()  # final steps now that video mode has been set
+        (int(cfg.width_px * WIDTH_STRETCH), cfg.height_px),
+        pg.FULLSCREEN if cfg.full_screen else 0)
+    img.post_init()  # final steps now that video mode has been set
+    sfx.post_init()
+    if pool is not None:
+        pool.shutdown(wait=False)  # game over assets load in the background
+
+    # Initialise game drawer and game loop
+    drawer = Drawer(util, img, txt, cfg)
+    loop = Loop(util, cfg, sfx, txt, drawer)
+    return screen, cfg, util, scores, loop
+
+
+def main(record: bool = False, timings_file: Optional[str] = None,
+         save_file: Optional[str] = None, resume_file: Optional[str] = None):
+    if record and resume_file is not None:
+        raise Exception('Resumed games cannot be recorded')
+    screen, cfg, util, scores, loop = start()
+    if record:
+        os.makedirs(REPLAY_FOLDER, exist_ok=True)
+    if timings_file is not None and loop.timings is None:
+        loop.set_timings(FrameTimings())
 
     running = True
     while running:
-        # Create and run game
-        game = Game(UTIL, CFG, SFX, (TILES_X, TILES_Y))
-        running = LOOP.main(screen, game)  # runs game loop
+        # Create and run game (recording it if asked to); the first one
+        # carries on from a saved game if asked to
+        game = Game(util, cfg, (TILES_X, TILES_Y))
+        if resume_file is not None:
+            restore(game, load(resume_file))
+            resume_file = None
+        if record:
+            game.recorder = Recorder(game)
+        running = loop.main(screen, game)  # runs game loop
+        if record:
+            game.recorder.write(REPLAY_FOLDER + datetime.now().strftime(
+                '%Y%m%d-%H%M%S.replay'))
+
+        # Save game if quit part way through
+        if not running and not game.game_over and save_file is not None:
+            save(game, save_file)
 
         # Game over sequence (if game still running)
         if running:
-            running = LOOP.game_over(screen, game, SCORES)
+            running = loop.game_over(screen, game, scores)
+
+    # Dump frame timings of the last frames played
+    if timings_file is not None:
+        loop.timings.write(timings_file)
+
+
+if __name__ == '__main__':
+    # python run_game.py [--record] [--timings <file>.csv|.json]
+    #                    [--save <file>] [--resume <file>]
+    args = sys.argv[1:]
+
+    def get_arg(name: str) -> Optional[str]:
+        if name not in args:
+            return None
+        i = args.index(name) + 1
+        if i == len(args) or args[i].startswith('--'):
+            print('Usage: python run_game.py [--record] '
+                  '[--timings <file>.csv|.json] [--save <file>] '
+                  '[--resume <file>]')
+            sys.exit(2)
+        return args[i]
+
+    main('--record' in args, get_arg('--timings'), get_arg('--save'),
+         get_arg('--resume'))
@@ -0,0 +1,44 @@
+import random
+import sys
+import time
+
+from src.game import Game
+from src.utils.config import Config
+from src.utils.tiles import Tiles
+
+TILES_X = 30  # number of tiles horizontally
+TILES_Y = 30  # number of tiles vertically
+GAME_SIZE_PX = 900  # nominal pixel size (only affects bullet positions)
+TICK_MS = 8  # simulated milliseconds per tick, unless tick_ms configured
+KEY_PRESS_CHANCE = 0.05  # chance of a random key press per tick
+
+if __name__ == '__main__':
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    cfg = Config('config.ini')
+    cfg.read()
+    tiles = Tiles((GAME_SIZE_PX, GAME_SIZE_PX), (TILES_X, TILES_Y))
+
+    # Random direction and shoot keys (pausing would stall the simulation)
+    keys = []
+    for p in cfg.players:
+        for ctrl in [p.ctrl_up, p.ctrl_down, p.ctrl_left, p.ctrl_right,
+                     p.ctrl_shoot]:
+            keys += list(ctrl)
+
+    tick_ms = cfg.tick_ms or TICK_MS
+    games = 1
+    game = Game(tiles, cfg, (TILES_X, TILES_Y))
+    start = time.perf_counter()
+    for _ in range(ticks):
+        inputs = []
+        if random.random() < KEY_PRESS_CHANCE:
+            inputs.append((random.choice(keys), True))
+        game.step(tick_ms, inputs)
+        if game.game_over:
+            games += 1
+            game = Game(tiles, cfg, (TILES_X, TILES_Y))
+    elapsed = time.perf_counter() - start
+
+    print('Simulated {} ticks over {} games in {:.2f}s ({:.0f} ticks/sec)'
+          ''.format(ticks, games, elapsed, ticks / elapsed))
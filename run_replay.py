@@ -0,0 +1,27 @@
+import sys
+import time
+
+from src.replay import Replay
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('Usage: python run_replay.py <replay file>...')
+        sys.exit(2)
+
+    # Re-simulate each recording headlessly and check its final state
+    all_verified = True
+    for replay_file in sys.argv[1:]:
+        replay = Replay(replay_file)
+        start = time.perf_counter()
+        game = replay.play()
+        elapsed = time.perf_counter() - start
+
+        verified = replay.verify(game)
+        all_verified = all_verified and verified
+        print('{}: {} steps ({:.1f}s of play) in {:.2f}s ({:.0f}x real '
+              'time), level {}, final state {}'.format(
+                  replay_file, len(replay.steps), replay.duration_ms / 1000,
+                  elapsed, replay.duration_ms / 1000 / max(elapsed, 1e-9),
+                  game.level, 'OK' if verified else 'MISMATCH'))
+
+    sys.exit(0 if all_verified else 1)
@@ -0,0 +1,26 @@
+import asyncio
+import sys
+
+from src.net import DEFAULT_PORT
+from src.server import Server, SERVER_TICK_MS
+from src.utils.config import Config
+from src.utils.tiles import Tiles
+
+TILES_X = 30  # as in run_game.py (clients check that they match)
+TILES_Y = 30
+GAME_SIZE_PX = 900  # board size in pixels (only affects bullet positions)
+PLAYERS_PER_MATCH = 2
+
+if __name__ == '__main__':
+    # python run_server.py [players per match] [port]
+    players = int(sys.argv[1]) if len(sys.argv) > 1 else PLAYERS_PER_MATCH
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_PORT
+
+    cfg = Config('config.ini')
+    cfg.read()
+    tiles = Tiles((GAME_SIZE_PX, GAME_SIZE_PX), (TILES_X, TILES_Y))
+    server = Server(tiles, players, cfg.tick_ms or SERVER_TICK_MS)
+    try:
+        asyncio.run(server.serve(port=port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,36 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RUNS = 5  # fresh processes per measurement (median is reported)
+
+if __name__ == '__main__':
+    # Child: start the game as run_game.py does, draw one frame and exit
+    if len(sys.argv) > 2 and sys.argv[1] == '--child':
+        import pygame as pg
+        import run_game
+        from src.game import Game
+
+        screen, cfg, util, _, loop = run_game.start(int(sys.argv[2]))
+        game = Game(util, cfg, (run_game.TILES_X, run_game.TILES_Y))
+        loop.drawer.draw_game(screen, game, 0)
+        pg.display.flip()
+        pg.quit()
+        sys.exit()
+
+    # Without a display: SDL_VIDEODRIVER=dummy SDL_AUDIODRIVER=dummy
+    import run_game
+
+    for threads in [0, run_game.LOADING_THREADS]:
+        times = []
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, __file__, '--child',
+                            str(threads)], check=True, env=os.environ,
+                           stdout=subprocess.DEVNULL)
+            times.append(time.perf_counter() - start)
+        print('Loading threads: {}, start-up to first frame: {:.0f} ms '
+              '(median of {})'.format(threads,
+                                      statistics.median(times) * 1000, RUNS))
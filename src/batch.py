@@ -0,0 +1,387 @@
+from random import Random
+from typing import Optional, Sequence
+
+import numpy as np
+
+from src.game import STARTING_LEVEL, BASE_SPEED, SPEED_BOOST, ACCELERATION, \
+    SAFE_ZONE_TILES, GHOST_TIMER_MS, INIT_NO_OF_BULLETS, \
+    CLEAR_SKULLS_EVERY_LEVEL, CLEAR_POWERUPS_IF_NOT_PICKED_UP
+from src.snake import STARTING_LENGTH, MAX_QUEUED_TURNS
+from src.utils.direction import Direction
+from src.utils.tiles import Coords, CoordsList, Tiles
+
+NO_TILE = -1  # object not on the board
+NO_INPUT = -1  # no change of direction requested
+OPPOSITE = np.array([Direction.DOWN.value, Direction.UP.value,
+                     Direction.RIGHT.value, Direction.LEFT.value])
+
+
+def get_moves_per_ms_by_level(level: int) -> float:
+    moves_per_sec = BASE_SPEED + (ACCELERATION * (level - 1))
+    return moves_per_sec / 1000
+
+
+class BatchGame:
+    # N independent single-snake games stored in NumPy arrays and advanced
+    # together. Tiles are flattened (x * tiles_y + y) and each snake body is
+    # a ring buffer with per-tile segment counts. Occupancy and free tiles
+    # are updated in the same order as in Game and spawning (rare) is done
+    # per game with the same random calls, which keeps both engines equal
+    # tick-for-tick for the same seeds and inputs. Shooting is not supported
+    # (picked up bullets are only counted).
+
+    def __init__(self, util: Tiles, seeds: Sequence[int]):
+        self.util = util
+        self.n = len(seeds)
+        self.rngs = [Random(seed) for seed in seeds]
+
+        # Board
+        tx = self.tiles_x = util.tiles_x
+        ty = self.tiles_y = util.tiles_y
+        self.no_of_tiles = tx * ty
+        xs, ys = np.divmod(np.arange(self.no_of_tiles), ty)
+        self.next_tile = np.empty((len(Direction), self.no_of_tiles), int)
+        for direction, (x_table, y_table) in util.next_tile_tables.items():
+            self.next_tile[direction.value] = \
+                np.take(x_table, xs) * ty + np.take(y_table, ys)
+
+        # Games
+        n = self.n
+        self.game_over = np.zeros(n, bool)
+        self.level = np.full(n, STARTING_LEVEL)
+        self.minus_enemies = np.zeros(n)
+        self.minus_poisons = np.zeros(n)
+
+        # Snakes (all starting at tile (0, 0) as ghosts)
+        self.capacity = self.no_of_tiles
+        self.body = np.zeros((n, self.capacity), int)
+        self.head_ptr = np.zeros(n, int)
+        self.length = np.full(n, STARTING_LENGTH)
+        self.max_length_reached = np.full(n, STARTING_LENGTH)
+        self.segments = np.zeros((n, self.no_of_tiles), int)
+        self.segments[:, 0] = STARTING_LENGTH
+        self.last_direction_moved = np.full(n, Direction.RIGHT.value)
+        self.turns = np.zeros((n, MAX_QUEUED_TURNS), int)  # as Snake.turns
+        self.no_of_turns = np.zeros(n, int)
+        self.base_moves_per_ms = np.full(
+            n, get_moves_per_ms_by_level(STARTING_LEVEL))
+        self.boost_moves_per_ms = np.zeros(n)
+        self.ms_idle = np.zeros(n)
+        self.is_shield_on = np.zeros(n, bool)
+        self.ghost_ms = np.full(n, GHOST_TIMER_MS)
+        self.bullets = np.zeros(n, int)
+
+        # Apple and powerups (NO_TILE if none), skulls (in spawn order)
+        self.apple = np.full(n, NO_TILE)
+        self.pow_shield = np.full(n, NO_TILE)
+        self.pow_ghost = np.full(n, NO_TILE)
+        self.pow_bomb = np.full(n, NO_TILE)
+        self.pow_bullets = np.full(n, NO_TILE)
+        self.enemies = [[] for _ in range(n)]
+        self.poisons = [[] for _ in range(n)]
+        self.enemy_mask = np.zeros((n, self.no_of_tiles), bool)
+        self.poison_mask = np.zeros((n, self.no_of_tiles), bool)
+
+        # Snake segments and objects per tile, free tiles as in FreeTiles
+        self.occupancy = np.zeros((n, self.no_of_tiles), int)
+        self.free_tiles = np.tile(np.arange(self.no_of_tiles), (n, 1))
+        self.free_position = self.free_tiles.copy()
+        self.no_of_free_tiles = np.full(n, self.no_of_tiles)
+
+        # Occupy starting tiles and generate first apples
+        for i in range(n):
+            for _ in range(STARTING_LENGTH):
+                self.occupy(i, 0)
+            self.new_objects(i)
+
+    @property
+    def direction(self) -> np.ndarray:
+        # Direction value of each snake's next move
+        return np.where(self.no_of_turns > 0, self.turns[:, 0],
+                        self.last_direction_moved)
+
+    def to_coords(self, tile: int) -> Optional[Coords]:
+        if tile == NO_TILE:
+            return None
+        return int(tile // self.tiles_y), int(tile % self.tiles_y)
+
+    def to_tile(self, coords: Coords) -> int:
+        return coords[0] * self.tiles_y + coords[1]
+
+    def snake_coords(self, i: int) -> CoordsList:
+        ptr = self.head_ptr[i]
+        return [self.to_coords(self.body[i, (ptr + k) % self.capacity])
+                for k in range(self.length[i])]
+
+    def no_of_enemies(self, i: int) -> float:
+        return (self.level[i] / 2) - self.minus_enemies[i]
+
+    def no_of_poisons(self, i: int) -> float:
+        return (self.level[i] - 1) - self.minus_poisons[i]
+
+    def occupy(self, i: int, tile: int):
+        if self.occupancy[i, tile] == 0:
+            position = self.free_position[i, tile]
+            last = self.free_tiles[i, self.no_of_free_tiles[i] - 1]
+            self.free_tiles[i, position] = last
+            self.free_position[i, last] = position
+            self.no_of_free_tiles[i] -= 1
+        self.occupancy[i, tile] += 1
+
+    def vacate(self, i: int, tile: int):
+        if tile != NO_TILE:
+            self.occupancy[i, tile] -= 1
+            if self.occupancy[i, tile] == 0:
+                self.free_tiles[i, self.no_of_free_tiles[i]] = tile
+                self.free_position[i, tile] = self.no_of_free_tiles[i]
+                self.no_of_free_tiles[i] += 1
+
+    def get_free_tile(self, i: int) -> int:
+        # NO_TILE if the board is full
+        if self.no_of_free_tiles[i] == 0:
+            return NO_TILE
+        k = self.rngs[i].randrange(self.no_of_free_tiles[i])
+        tile = int(self.free_tiles[i, k])
+        self.occupy(i, tile)
+        return tile
+
+    def new_objects(self, i: int):
+        rng = self.rngs[i]
+        level = int(self.level[i])
+
+        # Clear previous objects (remaining ones are already marked occupied)
+        self.vacate(i, self.apple[i])
+        if CLEAR_POWERUPS_IF_NOT_PICKED_UP:
+            self.clear_powerups(i)
+        if CLEAR_SKULLS_EVERY_LEVEL:
+            self.clear_skulls(i)
+
+        # New apple and powerups (same spawn rules as Game)
+        self.apple[i] = self.get_free_tile(i)
+        if level > 0 and level % 2 == 0 and bool(rng.getrandbits(1)):
+            self.pow_shield[i] = self.get_free_tile(i)
+        if level > 10 and level % 2 == 1 and bool(rng.getrandbits(1)):
+            self.pow_ghost[i] = self.get_free_tile(i)
+        if level > 0 and level % 20 == 0:
+            self.pow_bomb[i] = self.get_free_tile(i)
+        if level > 0 and level % 10 == 0:
+            self.pow_bullets[i] = self.get_free_tile(i)
+
+        # Mark front of snake taken to avoid immediately hitting enemies/poison
+        head = self.to_coords(self.body[i, self.head_ptr[i]])
+        direction = self.turns[i, 0] if self.no_of_turns[i] > 0 \
+            else self.last_direction_moved[i]
+        safe_zone = [self.to_tile(tile) for tile in self.util.get_tiles_ahead(
+            head, Direction(direction), SAFE_ZONE_TILES)]
+        for tile in safe_zone:
+            self.occupy(i, tile)
+
+        # Match skull lists with expected number of skulls
+        enemies, poisons = self.enemies[i], self.poisons[i]
+        while len(enemies) < int(self.no_of_enemies(i)):
+            enemy = self.get_free_tile(i)
+            if enemy == NO_TILE:
+                break
+            enemies.append(enemy)
+            self.enemy_mask[i, enemy] = True
+        while len(enemies) > int(self.no_of_enemies(i)):
+            enemy = enemies.pop()
+            self.enemy_mask[i, enemy] = False
+            self.vacate(i, enemy)
+        while len(poisons) < int(self.no_of_poisons(i)):
+            poison = self.get_free_tile(i)
+            if poison == NO_TILE:
+                break
+            poisons.append(poison)
+            self.poison_mask[i, poison] = True
+        while len(poisons) > int(self.no_of_poisons(i)):
+            poison = poisons.pop()
+            self.poison_mask[i, poison] = False
+            self.vacate(i, poison)
+
+        # Unmark front of snake
+        for tile in safe_zone:
+            self.vacate(i, tile)
+
+    def clear_powerups(self, i: int):
+        for powerup in [self.pow_shield, self.pow_ghost,
+                        self.pow_bomb, self.pow_bullets]:
+            self.vacate(i, powerup[i])
+            powerup[i] = NO_TILE
+
+    def clear_skulls(self, i: int):
+        for skull in self.enemies[i] + self.poisons[i]:
+            self.vacate(i, skull)
+        self.enemies[i].clear()
+        self.poisons[i].clear()
+        self.enemy_mask[i] = False
+        self.poison_mask[i] = False
+
+    def double_capacity(self):
+        # Ghost snakes can overlap themselves, so length is not bounded by
+        # the number of tiles; re-linearise bodies with head at index 0
+        offsets = np.arange(self.capacity)
+        order = (self.head_ptr[:, None] + offsets[None, :]) % self.capacity
+        body = np.zeros((self.n, 2 * self.capacity), int)
+        body[:, :self.capacity] = np.take_along_axis(self.body, order, 1)
+        self.body = body
+        self.head_ptr[:] = 0
+        self.capacity *= 2
+
+    def grow_by_one(self, i: int):
+        if self.length[i] == self.capacity:
+            self.double_capacity()
+        tip = self.body[i, (self.head_ptr[i] + self.length[i] - 1)
+                        % self.capacity]
+        self.body[i, (self.head_ptr[i] + self.length[i]) % self.capacity] = tip
+        self.segments[i, tip] += 1
+        self.occupy(i, tip)
+        self.length[i] += 1
+        self.max_length_reached[i] = max(self.max_length_reached[i],
+                                         self.length[i])
+
+    def shrink_by_one(self, i: int):
+        tip = self.body[i, (self.head_ptr[i] + self.length[i] - 1)
+                        % self.capacity]
+        self.segments[i, tip] -= 1
+        self.vacate(i, tip)
+        self.length[i] -= 1
+
+    def check_snake_hits(self, i: int, head: int):
+        # Same order as Game.check_snake_hits (self-hits already checked)
+        if head == self.apple[i]:
+            self.level[i] += 1
+            self.grow_by_one(i)
+            self.base_moves_per_ms[i] = \
+                get_moves_per_ms_by_level(int(self.level[i]))
+            self.new_objects(i)
+        elif head == self.pow_shield[i]:
+            self.is_shield_on[i] = True
+            self.vacate(i, head)
+            self.pow_shield[i] = NO_TILE
+        elif head == self.pow_ghost[i]:
+            self.ghost_ms[i] = GHOST_TIMER_MS
+            self.vacate(i, head)
+            self.pow_ghost[i] = NO_TILE
+        elif head == self.pow_bomb[i]:
+            self.minus_enemies[i] += self.no_of_enemies(i)
+            self.minus_poisons[i] += self.no_of_poisons(i)
+            self.clear_skulls(i)
+            for powerup in [self.pow_shield, self.pow_ghost, self.pow_bomb]:
+                self.vacate(i, powerup[i])
+                powerup[i] = NO_TILE
+        elif head == self.pow_bullets[i]:
+            self.bullets[i] += INIT_NO_OF_BULLETS
+            self.vacate(i, head)
+            self.pow_bullets[i] = NO_TILE
+
+        # Check if hit enemy
+        if self.ghost_ms[i] <= 0 and self.enemy_mask[i, head]:
+            self.enemies[i].remove(head)
+            self.enemy_mask[i, head] = False
+            self.vacate(i, head)
+            if self.is_shield_on[i]:
+                self.is_shield_on[i] = False
+            else:
+                self.game_over[i] = True
+                return
+
+        # Check if hit poison
+        if self.ghost_ms[i] <= 0 and self.poison_mask[i, head]:
+            self.poisons[i].remove(head)
+            self.poison_mask[i, head] = False
+            self.vacate(i, head)
+            if self.is_shield_on[i]:
+                self.is_shield_on[i] = False
+            else:
+                self.shrink_by_one(i)
+                if self.length[i] < 1:
+                    self.game_over[i] = True
+
+    def occupy_all(self, games: np.ndarray, tiles: np.ndarray):
+        # Vectorised occupy() of one tile per game
+        was_free = self.occupancy[games, tiles] == 0
+        self.occupancy[games, tiles] += 1
+        games, tiles = games[was_free], tiles[was_free]
+        positions = self.free_position[games, tiles]
+        last = self.free_tiles[games, self.no_of_free_tiles[games] - 1]
+        self.free_tiles[games, positions] = last
+        self.free_position[games, last] = positions
+        self.no_of_free_tiles[games] -= 1
+
+    def vacate_all(self, games: np.ndarray, tiles: np.ndarray):
+        # Vectorised vacate() of one tile per game
+        self.occupancy[games, tiles] -= 1
+        now_free = self.occupancy[games, tiles] == 0
+        games, tiles = games[now_free], tiles[now_free]
+        self.free_tiles[games, self.no_of_free_tiles[games]] = tiles
+        self.free_position[games, tiles] = self.no_of_free_tiles[games]
+        self.no_of_free_tiles[games] += 1
+
+    def step(self, dt: float, directions: Optional[np.ndarray] = None,
+             boost: Optional[np.ndarray] = None):
+        # Advance all games which are not over by one tick. directions holds
+        # a Direction value (or NO_INPUT) and boost the boost button state
+        # per game.
+        live = ~self.game_over
+        if directions is not None:
+            # Queue turns as in Snake.set_direction
+            directions = np.asarray(directions)
+            games = np.arange(self.n)
+            last = np.where(self.no_of_turns > 0,
+                            self.turns[games, self.no_of_turns - 1],
+                            self.last_direction_moved)
+            turn = live & (directions != NO_INPUT) & (directions != last) & \
+                (directions != OPPOSITE[last]) & \
+                (self.no_of_turns < MAX_QUEUED_TURNS)
+            self.turns[turn, self.no_of_turns[turn]] = directions[turn]
+            self.no_of_turns[turn] += 1
+        if boost is not None:
+            boost_moves_per_ms = np.where(boost, SPEED_BOOST / 1000, 0)
+            self.boost_moves_per_ms[live] = boost_moves_per_ms[live]
+
+        # Progress snakes' time
+        self.ms_idle[live] += dt
+        ghosts = live & (self.ghost_ms > 0)
+        self.ghost_ms[ghosts] = np.maximum(0, self.ghost_ms[ghosts] - dt)
+
+        # Snakes which can move, move once
+        ms_per_move = 1 / (self.base_moves_per_ms + self.boost_moves_per_ms)
+        moving = np.flatnonzero(live & (self.ms_idle >= ms_per_move))
+        if len(moving) == 0:
+            return
+        self.ms_idle[moving] -= ms_per_move[moving]
+
+        # Add new head and remove old tip
+        ptr = self.head_ptr[moving]
+        tips = self.body[moving, (ptr + self.length[moving] - 1)
+                         % self.capacity]
+        direction = self.direction[moving]
+        heads = self.next_tile[direction, self.body[moving, ptr]]
+        self.segments[moving, tips] -= 1
+        self.vacate_all(moving, tips)
+        ptr = (ptr - 1) % self.capacity
+        self.head_ptr[moving] = ptr
+        self.body[moving, ptr] = heads
+        self.segments[moving, heads] += 1
+        self.occupy_all(moving, heads)
+        self.last_direction_moved[moving] = direction
+        turned = moving[self.no_of_turns[moving] > 0]
+        self.turns[turned, :-1] = self.turns[turned, 1:]
+        self.no_of_turns[turned] -= 1
+
+        # Check if hit itself (head counted once in segments)
+        ghost_on = self.ghost_ms[moving] > 0
+        hit_self = (self.segments[moving, heads] > 1) & ~ghost_on
+        self.game_over[moving[hit_self]] = True
+        moving, heads = moving[~hit_self], heads[~hit_self]
+
+        # Remaining checks only for the (few) snakes that hit something
+        hit = (heads == self.apple[moving]) | \
+            (heads == self.pow_shield[moving]) | \
+            (heads == self.pow_ghost[moving]) | \
+            (heads == self.pow_bomb[moving]) | \
+            (heads == self.pow_bullets[moving]) | \
+            self.enemy_mask[moving, heads] | self.poison_mask[moving, heads]
+        for i, head in zip(moving[hit], heads[hit]):
+            self.check_snake_hits(int(i), int(head))
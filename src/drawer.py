@@ -1,141 +1,402 @@
+import math
+from collections import defaultdict
+from typing import Dict, List
+
 from src.game import Game
 from src.utils.anim import SpriteSheetAnimation
 from src.utils.colours import *
 from src.utils.config import Config
 from src.utils.img import ImgHolder
-from src.utils.text import Text
-from src.utils.util import rotate_image, Util
-from src.snake import Snake
+from src.utils.text import Text, TextCache
+from src.utils.tiles import Coords, CoordsList
+from src.utils.timings import COLUMNS, FrameTimings, PERCENTILES
+from src.utils.util import Util
+
+BULLET_RADIUS = 4  # pixels
+CAMERA_MARGIN = 0.25  # of the view kept between the snakes and its edges
+TIMINGS_REFRESH_FRAMES = 30  # frames between timings overlay updates
 
 
 class Drawer:
     def __init__(self, util: Util, img: ImgHolder, txt: Text, cfg: Config):
+        # Expects img.post_init() to have been called (needs video mode)
         self.util = util
         self.img = img
         self.txt = txt
         self.cfg = cfg
 
         self.hud_font = pg.font.SysFont(cfg.font, int(self.cfg.width_px / 40))
-        self.pup_anim = SpriteSheetAnimation(img.powerups_marker, 40)
-        self.pup_imgs = [img.shield, img.ghost, img.bomb, img.bullets]
+        self.hud_text = TextCache(self.hud_font)
 
-    def draw_game(self, screen, game: Game, dt: int):
-        def draw_background():
-            screen.fill(BLACK)
-            screen.blit(self.img.background, (0, 0))
+        # Tile sprites are areas of the atlas, blitted from it
+        self.atlas = img.atlas
+        self.sprites = img.sprites
+        self.pup_anim = SpriteSheetAnimation(
+            img.atlas.subsurface(self.sprites['powerups_marker']), 40)
+        self.pup_rects = [self.sprites[name] for name in
+                          ['shield', 'ghost', 'bomb', 'bullets']]
+
+        # Camera: the tiles in view (all of them if the board fits) and
+        # their top-left corner in board pixels
+        self.scrolls = util.view_tiles_x < util.tiles_x or \
+            util.view_tiles_y < util.tiles_y
+        self.view = pg.Rect(0, 0, util.view_tiles_x, util.view_tiles_y)
+        self.camera_px = (0, 0)
+        self.camera_game = None
+        self.view_background = None
+        self.view_background_key = None
+
+        # Dirty-rectangle mode: what was drawn last frame, and the screen
+        # areas changed since the last display update
+        self.board_rect = pg.Rect(0, 0, cfg.width_px, cfg.height_px)
+        xs = util.tile_x_px + [util.width_px]
+        ys = util.tile_y_px + [util.height_px]
+        self.tile_widths = [x1 - x0 for x0, x1 in zip(xs, xs[1:])]
+        self.tile_heights = [y1 - y0 for y0, y1 in zip(ys, ys[1:])]
+        self.drawn_game = None
+        self.drawn_view = None
+        self.drawn_sprites = {}
+        self.drawn_hud_lines = []
+        self.drawn_bullet_rects = []
+        self.overlay_rects = []
+        self.dirty_rects = []
+
+        # Full redraw mode: pre-composited background, apple and skulls
+        self.static_layer = None
+        self.static_game = None
+        self.static_key = None
+        self.static_sprites = {}
+
+        # Frame timings (drawing phases are marked if set; see Loop)
+        self.timings = None
+        self.timings_text = TextCache(self.hud_font)
+        self.timings_lines = []
+
+    def update_camera(self, game: Game):
+        # Moved (by whole tiles) as little as needed to keep the snakes'
+        # mean head position CAMERA_MARGIN inside the view, and kept on
+        # the board; starts from the top left for each new game
+        if game is not self.camera_game:
+            self.view.topleft = (0, 0)
+            self.camera_game = game
+        heads = [s.head for s in game.live_snakes if s.head is not None]
+        if self.scrolls and heads:
+            self.view.left = follow(
+                self.view.left, sum(h[0] for h in heads) / len(heads),
+                self.view.width, self.util.tiles_x)
+            self.view.top = follow(
+                self.view.top, sum(h[1] for h in heads) / len(heads),
+                self.view.height, self.util.tiles_y)
+        self.camera_px = self.util.get_xy(self.view.topleft)
+
+    def get_xy(self, tile: Coords) -> Coords:
+        # Position on screen
+        return self.util.tile_x_px[tile[0]] - self.camera_px[0], \
+            self.util.tile_y_px[tile[1]] - self.camera_px[1]
+
+    def get_tile_rect(self, tile: Coords) -> pg.Rect:
+        # Area on screen (tiles may be a pixel wider or higher than others)
+        return pg.Rect(self.get_xy(tile), (self.tile_widths[tile[0]],
+                                           self.tile_heights[tile[1]]))
 
-        def draw_snake_parts(snake: Snake):
-            # Draw snake parts (tail and head)
-            snake_img = self.img.snake_ghost \
+    def get_background(self) -> pg.Surface:
+        # Background image scrolled with the camera (repeated across the
+        # board), recomposed only when the camera moves
+        if not self.scrolls:
+            return self.img.background
+        key = self.view.topleft
+        if key != self.view_background_key:
+            background = self.img.background
+            width, height = background.get_size()
+            x = -(self.camera_px[0] % width)
+            y = -(self.camera_px[1] % height)
+            if self.view_background is None:
+                self.view_background = pg.Surface(
+                    background.get_size()).convert()
+            self.view_background.blits(
+                [(background, (x + i * width, y + j * height))
+                 for i in range(2) for j in range(2)], doreturn=False)
+            self.view_background_key = key
+        return self.view_background
+
+    def get_tile_sprites(self, game: Game) -> Dict[Coords, List[pg.Rect]]:
+        # Sprites on each tile in view in the order in which they are drawn
+        in_view = self.view.collidepoint
+        sprites = defaultdict(list)
+        for snake in game.live_snakes:
+            snake_sprite = self.sprites['snake_ghost'] \
                 if snake.is_ghost_on \
-                else self.img.snake_normal
+                else self.sprites['snake_normal']
             for s in snake:
-                screen.blit(snake_img, self.util.get_xy(s))
-            if snake.head is not None:
-                screen.blit(
-                    rotate_image(self.img.snake_eyes,
-                                 snake.last_direction_moved),
-                    self.util.get_xy(snake.head))
-
-        def draw_shielded_snake(snake: Snake):
-            # Draw shield on top of snake if has shield on
+                if in_view(s):
+                    sprites[s].append(snake_sprite)
+            if snake.head is not None and in_view(snake.head):
+                eyes = self.img.snake_eyes_by_direction
+                sprites[snake.head].append(eyes[snake.last_direction_moved])
             if snake.is_shield_on:
                 for s in snake:
-                    screen.blit(self.img.snake_shielded, self.util.get_xy(s))
-
-        def draw_apple():
-            if game.apple is not None:
-                screen.blit(self.img.apple, self.util.get_xy(game.apple))
-
-        def draw_powerups():
-            # Move powerup animation
-            self.pup_anim.move(dt)
-
-            # Draw powerups
-            powerups = [game.pow_shield, game.pow_ghost,
-                        game.pow_bomb, game.pow_bullets]
-            for powerup, image in zip(powerups, self.pup_imgs):
-                if powerup is not None:
-                    screen.blit(self.pup_anim.get_sprite(),
-                                self.util.get_xy(powerup))
-                    screen.blit(image, self.util.get_xy(powerup))
-
-        def draw_enemies():
-            for e in game.enemies:
-                screen.blit(self.img.enemy, self.util.get_xy(e))
-
-        def draw_poisons():
-            for p in game.poisons:
-                screen.blit(self.img.poison, self.util.get_xy(p))
-
-        def draw_bullets():
-            for b in game.fired_bullets:
-                pg.draw.circle(screen, YELLOW, b.coords, 4)
-
-        def draw_hud(snake: Snake, y_offset: int = 0) -> int:
-            # Draw current level
-            level_text = '({}) Current level: {}'.format(
-                snake.player.name, game.level)
-            level_surface = self.hud_font.render(level_text, True, WHITE)
-            screen.blit(level_surface, (self.cfg.width_px, y_offset))
-            y_offset += level_surface.get_height()
-
-            # Draw current length
-            curlen_text = '({}) Current length: {}'.format(
-                snake.player.name, len(snake))
-            curlen_surface = self.hud_font.render(curlen_text, True, WHITE)
-            screen.blit(curlen_surface, (self.cfg.width_px, y_offset))
-            y_offset += curlen_surface.get_height()
-
-            # Draw max length
-            maxlen_text = '({}) Max length: {}'.format(
-                snake.player.name, snake.max_length_reached)
-            maxlen_surface = self.hud_font.render(maxlen_text, True, WHITE)
-            screen.blit(maxlen_surface, (self.cfg.width_px, y_offset))
-            y_offset += maxlen_surface.get_height()
-
-            # Draw bullets indicator
+                    if in_view(s):
+                        sprites[s].append(self.sprites['snake_shielded'])
+        if game.apple is not None and in_view(game.apple):
+            sprites[game.apple].append(self.sprites['apple'])
+        powerups = [game.pow_shield, game.pow_ghost,
+                    game.pow_bomb, game.pow_bullets]
+        for powerup, sprite in zip(powerups, self.pup_rects):
+            if powerup is not None and in_view(powerup):
+                sprites[powerup].append(self.pup_anim.get_rect())
+                sprites[powerup].append(sprite)
+        for e in game.enemies:
+            if in_view(e):
+                sprites[e].append(self.sprites['enemy'])
+        for p in game.poisons:
+            if in_view(p):
+                sprites[p].append(self.sprites['poison'])
+        return sprites
+
+    def get_static_sprites(self, game: Game) -> Dict[Coords, pg.Rect]:
+        # Sprites in view that only change when objects are spawned or
+        # removed
+        in_view = self.view.collidepoint
+        sprites = {}
+        if game.apple is not None and in_view(game.apple):
+            sprites[game.apple] = self.sprites['apple']
+        for e in game.enemies:
+            if in_view(e):
+                sprites[e] = self.sprites['enemy']
+        for p in game.poisons:
+            if in_view(p):
+                sprites[p] = self.sprites['poison']
+        return sprites
+
+    def get_static_layer(self, screen, game: Game) -> pg.Surface:
+        # Background with the apple and skulls composited on top, rebuilt
+        # only when one of them changes or the camera moves
+        key = (game.apple, tuple(game.enemies), tuple(game.poisons),
+               self.view.topleft)
+        if game is self.static_game and key == self.static_key:
+            return self.static_layer
+        if self.static_layer is None or \
+                self.static_layer.get_size() != screen.get_size():
+            self.static_layer = pg.Surface(screen.get_size()).convert()
+        self.static_layer.fill(BLACK)
+        self.static_layer.blit(self.get_background(), (0, 0))
+        self.static_sprites = self.get_static_sprites(game)
+        self.static_layer.blits(
+            [(self.atlas, self.get_xy(tile), sprite)
+             for tile, sprite in self.static_sprites.items()],
+            doreturn=False)
+        self.static_game = game
+        self.static_key = key
+        return self.static_layer
+
+    def get_sprite_blits(self, game: Game) -> list:
+        # Per-frame sprites (snakes and powerups) in view as a Surface.blits
+        # sequence
+        atlas = self.atlas
+        in_view = self.view.collidepoint
+        snake_blits = []
+        covered = {}  # static sprites under (ghost) snakes
+        for snake in game.live_snakes:
+            snake_sprite = self.sprites['snake_ghost'] \
+                if snake.is_ghost_on \
+                else self.sprites['snake_normal']
+            for s in snake:
+                if not in_view(s):
+                    continue
+                snake_blits.append((atlas, self.get_xy(s), snake_sprite))
+                if s in self.static_sprites:
+                    covered[s] = self.static_sprites[s]
+            if snake.head is not None and in_view(snake.head):
+                eyes = self.img.snake_eyes_by_direction
+                snake_blits.append((atlas, self.get_xy(snake.head),
+                                    eyes[snake.last_direction_moved]))
+            if snake.is_shield_on:
+                shielded = self.sprites['snake_shielded']
+                for s in snake:
+                    if in_view(s):
+                        snake_blits.append((atlas, self.get_xy(s), shielded))
+
+        # Static sprites are drawn over snakes, so tiles where they overlap
+        # are cleared back to the background first and redrawn on top
+        blits = []
+        background = self.get_background()
+        for tile in covered:
+            rect = self.get_tile_rect(tile)
+            blits.append((background, rect, rect))
+        blits += snake_blits
+        for tile, sprite in covered.items():
+            blits.append((atlas, self.get_xy(tile), sprite))
+
+        powerups = [game.pow_shield, game.pow_ghost,
+                    game.pow_bomb, game.pow_bullets]
+        for powerup, sprite in zip(powerups, self.pup_rects):
+            if powerup is not None and in_view(powerup):
+                xy = self.get_xy(powerup)
+                blits.append((atlas, xy, self.pup_anim.get_rect()))
+                blits.append((atlas, xy, sprite))
+        return blits
+
+    def get_hud_lines(self, game: Game) -> List[str]:
+        lines = []
+        for snake in game.live_snakes:
+            name = snake.player.name
+            lines.append('({}) Current level: {}'.format(name, game.level))
+            lines.append('({}) Current length: {}'.format(name, len(snake)))
+            lines.append('({}) Max length: {}'.format(
+                name, snake.max_length_reached))
             if snake.bullets > 0:
-                bullets_text = '({}) Bullets: {}'.format(
-                    snake.player.name, snake.bullets)
-                bullets_surface = self.hud_font.render(bullets_text, True,
-                                                       WHITE)
-                screen.blit(bullets_surface, (self.cfg.width_px, y_offset))
-                y_offset += bullets_surface.get_height()
-
-            # Draw ghost indicator
+                lines.append('({}) Bullets: {}'.format(name, snake.bullets))
             if snake.ghost_ms > 0:
-                ghost_seconds = snake.ghost_ms / 1000
-                ghost_text = '({}) Ghost: {:.1f}'.format(
-                    snake.player.name, ghost_seconds)
-                ghost_surface = self.hud_font.render(ghost_text, True, WHITE)
-                screen.blit(ghost_surface, (self.cfg.width_px, y_offset))
-                y_offset += ghost_surface.get_height()
-
-            # Draw shield indicator
+                lines.append('({}) Ghost: {:.1f}'.format(
+                    name, snake.ghost_ms / 1000))
             if snake.is_shield_on:
-                shield_text = '({}) Shield: ON'.format(snake.player.name)
-                shield_surface = self.hud_font.render(shield_text, True, WHITE)
-                screen.blit(shield_surface, (self.cfg.width_px, y_offset))
-                y_offset += shield_surface.get_height()
+                lines.append('({}) Shield: ON'.format(name))
+        return lines
+
+    def get_bullet_xys(self, game: Game, alpha: float) -> List[Coords]:
+        # Positions on screen of bullets in (or overlapping) the view
+        xys = game.fired_bullets.get_xys(alpha)
+        if not self.scrolls:
+            return xys
+        x0, y0 = self.camera_px
+        area = self.board_rect.inflate(4 * BULLET_RADIUS, 4 * BULLET_RADIUS)
+        return [xy for xy in [(x - x0, y - y0) for x, y in xys]
+                if area.collidepoint(xy)]
+
+    def get_tiles_under(self, rect: pg.Rect) -> CoordsList:
+        on_board = rect.clip(self.board_rect)
+        if on_board.width == 0 or on_board.height == 0:
+            return []
+        on_board = on_board.move(self.camera_px)
+        x0 = self.util.px_tile_x[on_board.left]
+        x1 = self.util.px_tile_x[on_board.right - 1]
+        y0 = self.util.px_tile_y[on_board.top]
+        y1 = self.util.px_tile_y[on_board.bottom - 1]
+        return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+    def get_hud_rect(self, screen) -> pg.Rect:
+        return pg.Rect(self.cfg.width_px, 0,
+                       screen.get_width() - self.cfg.width_px,
+                       screen.get_height())
 
-            return y_offset
+    def draw_hud_lines(self, screen, lines: List[str]):
+        blits = []
+        y_offset = 0
+        for line in lines:
+            surface = self.hud_text.render(line, WHITE)
+            blits.append((surface, (self.cfg.width_px, y_offset)))
+            y_offset += surface.get_height()
+        screen.blits(blits, doreturn=False)
 
-        draw_background()
+    def draw_game(self, screen, game: Game, dt: int, alpha: float = 1.0):
+        # Bullets are drawn alpha of the way through their last move
+        self.update_camera(game)
+        if self.cfg.dirty_rects:
+            self.draw_game_dirty(screen, game, dt, alpha)
+            return
 
-        for s in game.live_snakes:
-            draw_snake_parts(s)
-            draw_shielded_snake(s)
+        # Static layer, then everything else in a single batched blit
+        screen.blit(self.get_static_layer(screen, game), (0, 0))
+        self.mark('draw_board')
+        self.pup_anim.move(dt)
+        screen.blits(self.get_sprite_blits(game), doreturn=False)
+        self.mark('draw_sprites')
+        for xy in self.get_bullet_xys(game, alpha):
+            pg.draw.circle(screen, YELLOW, xy, BULLET_RADIUS)
+        self.mark('draw_bullets')
+
+        self.draw_hud_lines(screen, self.get_hud_lines(game))
+        self.mark('draw_hud')
+
+    def draw_game_dirty(self, screen, game: Game, dt: int,
+                        alpha: float = 1.0):
+        # Redraw only tiles whose sprites changed, plus areas covered by
+        # bullets and overlays last frame; changed areas go to dirty_rects
+        self.pup_anim.move(dt)
+        sprites = self.get_tile_sprites(game)
+        hud_lines = self.get_hud_lines(game)
+        hud_rect = self.get_hud_rect(screen)
+
+        # Work out what changed since last frame (everything if the camera
+        # moved)
+        full_redraw = game is not self.drawn_game or \
+            self.view.topleft != self.drawn_view
+        background = self.get_background()
+        if full_redraw:
+            screen.fill(BLACK)
+            screen.blit(background, (0, 0))
+            self.dirty_rects = [screen.get_rect()]
+            dirty_tiles = set(sprites)
+            hud_dirty = True
+        else:
+            drawn = self.drawn_sprites
+            dirty_tiles = {t for t, s in sprites.items() if drawn.get(t) != s}
+            dirty_tiles.update(t for t in drawn if t not in sprites)
+            hud_dirty = hud_lines != self.drawn_hud_lines
+            for rect in self.drawn_bullet_rects + self.overlay_rects:
+                dirty_tiles.update(self.get_tiles_under(rect))
+                hud_dirty = hud_dirty or rect.colliderect(hud_rect)
+        self.overlay_rects = []
+        self.mark('draw_board')
 
-        draw_apple()
-        draw_powerups()
-        draw_enemies()
-        draw_poisons()
-        draw_bullets()
+        # Restore background of changed tiles and redraw their sprites
+        blits = []
+        for tile in dirty_tiles:
+            rect = self.get_tile_rect(tile)
+            blits.append((background, rect, rect))
+            for sprite in sprites.get(tile, []):
+                blits.append((self.atlas, rect, sprite))
+            if not full_redraw:
+                self.dirty_rects.append(rect)
+        screen.blits(blits, doreturn=False)
+        self.mark('draw_sprites')
 
-        hud_y_offset = 0
-        for s in game.live_snakes:
-            hud_y_offset = draw_hud(s, hud_y_offset)
+        # Bullets (always moving) are redrawn every frame, between the HUD's
+        # background and text since they can overshoot into the HUD
+        bullet_xys = self.get_bullet_xys(game, alpha)
+        bullet_rects = []
+        for xy in bullet_xys:
+            rect = pg.Rect(0, 0, 2 * BULLET_RADIUS + 2, 2 * BULLET_RADIUS + 2)
+            rect.center = xy
+            bullet_rects.append(rect)
+            hud_dirty = hud_dirty or rect.colliderect(hud_rect)
+        if hud_dirty:
+            screen.fill(BLACK, hud_rect)
+        for xy in bullet_xys:
+            pg.draw.circle(screen, YELLOW, xy, BULLET_RADIUS)
+        self.mark('draw_bullets')
+        if hud_dirty:
+            self.draw_hud_lines(screen, hud_lines)
+        if not full_redraw:
+            self.dirty_rects += bullet_rects + self.drawn_bullet_rects
+            if hud_dirty:
+                self.dirty_rects.append(hud_rect)
+        self.mark('draw_hud')
+
+        self.drawn_game = game
+        self.drawn_view = self.view.topleft
+        self.drawn_sprites = sprites
+        self.drawn_hud_lines = hud_lines
+        self.drawn_bullet_rects = bullet_rects
+
+    def mark(self, phase: str):
+        if self.timings is not None:
+            self.timings.mark(phase)
+
+    def add_overlay_rect(self, rect: pg.Rect):
+        # Overlays are drawn over the game and removed on the next frame
+        if self.cfg.dirty_rects:
+            self.overlay_rects.append(rect)
+            self.dirty_rects.append(rect)
+
+    def pop_dirty_rects(self) -> List[pg.Rect]:
+        dirty_rects = self.dirty_rects
+        self.dirty_rects = []
+        return dirty_rects
+
+    def invalidate(self):
+        # Redraw everything on the next (dirty-rectangle mode) frame
+        self.drawn_game = None
 
     def draw_game_over_overlay(self, screen, alpha: int, score_saved: bool):
         # Game over image
@@ -157,7 +418,35 @@ class Drawer:
 
     def draw_paused_overlay(self, screen):
         screen.blit(self.txt.paused, self.txt.paused_rect)
+        self.add_overlay_rect(self.txt.paused_rect)
 
     def draw_fps(self, screen, fps: float):
-        fps_surface = self.hud_font.render(str(int(fps)), True, YELLOW)
-        screen.blit(fps_surface, (0, 0))
+        fps_surface = self.hud_text.render(str(int(fps)), YELLOW)
+        self.add_overlay_rect(screen.blit(fps_surface, (0, 0)))
+
+    def draw_timings(self, screen, timings: FrameTimings):
+        # Percentiles (ms) of each frame phase below the fps, worked out
+        # again every few frames only
+        if timings.no_of_frames % TIMINGS_REFRESH_FRAMES == 1 or \
+                not self.timings_lines:
+            percentiles = timings.get_percentiles()
+            self.timings_lines = ['ms: ' + ' / '.join(
+                'p{}'.format(p) for p in PERCENTILES)]
+            for c in COLUMNS:
+                self.timings_lines.append('{}: {}'.format(c, ' / '.join(
+                    '{:.2f}'.format(v) for v in percentiles[c])))
+
+        y_offset = self.hud_font.get_linesize()
+        for line in self.timings_lines:
+            surface = self.timings_text.render(line, YELLOW)
+            self.add_overlay_rect(screen.blit(surface, (0, y_offset)))
+            y_offset += surface.get_height()
+
+
+def follow(camera: int, focus: float, view: int, board: int) -> int:
+    # First tile in view (along one axis) moved as little as possible to
+    # keep focus a margin inside the view, then kept on the board
+    margin = int(view * CAMERA_MARGIN)
+    camera = min(camera, math.floor(focus) - margin)
+    camera = max(camera, math.ceil(focus) + margin + 1 - view)
+    return min(max(camera, 0), board - view)
@@ -0,0 +1,13 @@
+from enum import Enum
+
+
+class Event(Enum):
+    # Emitted by the game instead of playing sounds directly
+    APPLE = 0
+    POISON = 1
+    POWERUP = 2
+    SHIELD_OFF = 3
+    BULLET_FIRE = 4
+    BULLET_HIT_SKULL = 5
+    BULLET_HIT_SNAKE = 6
+    SNAKE_DEATH = 7
@@ -1,14 +1,16 @@
 import random
 from datetime import datetime
-from typing import List
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
 import numpy as np
 
+from src.events import Event
 from src.utils.config import Config
+from src.utils.direction import Direction
+from src.utils.free_tiles import FreeTiles
 from src.utils.score import Score
-from src.utils.sfx import SfxHolder
-from src.utils.util import Size2D, Direction, Util, Coords
-from src.projectile import Bullet
+from src.utils.tiles import Size2D, Coords, Tiles
+from src.projectile import Bullets
 from src.snake import Snake
 
 STARTING_LEVEL = 1  # starting level
@@ -21,19 +23,49 @@ INIT_NO_OF_BULLETS = 10  # initial number of bullets after picking up powerup
 CLEAR_SKULLS_EVERY_LEVEL = False  # whether to create new skulls per level
 CLEAR_POWERUPS_IF_NOT_PICKED_UP = True  # whether to clear uncollected powerups
 
+KeyInput = Tuple[int, bool]  # (key, True if pressed or False if released)
+
+# Key actions other than turning (turns are Directions)
+ACTION_PAUSE = 'pause'
+ACTION_BOOST = 'boost'
+ACTION_SHOOT = 'shoot'
+Action = Union[Direction, str]
+
+# Object on a tile in Game.objects (objects never share a tile)
+OBJ_NONE = 0
+OBJ_APPLE = 1
+OBJ_ENEMY = 2
+OBJ_POISON = 3
+OBJ_SHIELD = 4
+OBJ_GHOST = 5
+OBJ_BOMB = 6
+OBJ_BULLETS = 7
+
 
 class Game:
-    def __init__(self, util: Util, cfg: Config, sfx: SfxHolder,
-                 game_size_tiles: Size2D):
+    def __init__(self, util: Tiles, cfg: Config, game_size_tiles: Size2D,
+                 seed: Optional[int] = None):
         self.util = util
         self.cfg = cfg
-        self.sfx = sfx
+        self.seed = seed if seed is not None else random.getrandbits(64)
+        self.rng = random.Random(self.seed)
+        self.recorder = None  # adds every step if set (see src/replay.py)
 
         # Game
         self.game_size_tiles = game_size_tiles
         self.game_over = False
         self.level = STARTING_LEVEL
         self.paused = False
+        self.events = []  # emitted since last pop_events()
+
+        # Number of snake segments and objects on each tile, and empty tiles
+        self.occupancy = np.zeros(game_size_tiles, dtype=int)
+        self.free_tiles = FreeTiles(game_size_tiles)
+
+        # What is on each tile, so that hit checks are a single lookup: the
+        # object (if any) and the number of live snakes' segments
+        self.objects = np.full(game_size_tiles, OBJ_NONE, dtype=np.int8)
+        self.segments = np.zeros(game_size_tiles, dtype=int)
 
         # Snakes
         initial_speed = self.get_moves_per_ms_by_level()
@@ -41,11 +73,35 @@ class Game:
         for p in cfg.players:
             self.live_snakes.append(Snake(util, p, initial_speed))
         self.all_snakes = self.live_snakes  # backup list of all snakes
+        for snake in self.live_snakes:
+            for s in snake:
+                self.occupy_segment(s)
 
         # If multiple snakes, make ghosts so that they don't immediately collide
         for s in self.live_snakes:
             s.set_ghost(GHOST_TIMER_MS)
 
+        # Key -> [(snake, action)] for pressed keys, key -> [snake] for
+        # released boost keys
+        self.keymap: Dict[int, List[Tuple[Snake, Action]]] = {}
+        self.boost_keymap: Dict[int, List[Snake]] = {}
+        for s in self.live_snakes:
+            p = s.player
+            controls = [(Direction.UP, p.ctrl_up),
+                        (Direction.DOWN, p.ctrl_down),
+                        (Direction.LEFT, p.ctrl_left),
+                        (Direction.RIGHT, p.ctrl_right),
+                        (ACTION_PAUSE, p.ctrl_pause),
+                        (ACTION_BOOST, p.ctrl_boost),
+                        (ACTION_SHOOT, p.ctrl_shoot)]
+            for action, keys in controls:
+                for key in keys:
+                    bound = self.keymap.setdefault(key, [])
+                    if not bound or bound[-1][0] is not s:  # first one wins
+                        bound.append((s, action))
+            for key in p.ctrl_boost:
+                self.boost_keymap.setdefault(key, []).append(s)
+
         # Enemies, apple, powerups, bullets
         self.enemies = []
         self.poisons = []
@@ -54,7 +110,7 @@ class Game:
         self.pow_ghost = None
         self.pow_bomb = None
         self.pow_bullets = None
-        self.fired_bullets = []
+        self.fired_bullets = Bullets(util)
 
         # Minus enemies (due to bomb)
         self.minus_enemies = 0
@@ -80,6 +136,14 @@ class Game:
     def no_of_poisons(self) -> float:
         return (self.level - 1) - self.minus_poisons
 
+    def emit(self, event: Event) -> None:
+        self.events.append(event)
+
+    def pop_events(self) -> List[Event]:
+        events = self.events
+        self.events = []
+        return events
+
     def get_scores(self) -> List[Score]:
         timestamp = datetime.now()
         return [Score(snake.player.name, snake.max_length_reached,
@@ -88,12 +152,12 @@ class Game:
     def should_spawn_shield(self) -> bool:
         # Coin toss on even levels > 6 if shield not on
         return self.level > 0 and self.level % 2 == 0 \
-               and bool(random.getrandbits(1))
+               and bool(self.rng.getrandbits(1))
 
     def should_spawn_ghost(self) -> bool:
         # Coin toss on odd levels > 10 if ghost not on
         return self.level > 10 and self.level % 2 == 1 \
-               and bool(random.getrandbits(1))
+               and bool(self.rng.getrandbits(1))
 
     def should_spawn_bomb(self) -> bool:
         # Every 20n'th level for n >= 1
@@ -103,207 +167,253 @@ class Game:
         # Every 10n'th level for n >= 1
         return self.level > 0 and self.level % 10 == 0
 
-    def press_key(self, key: int):  # TODO: investigate how to optimise
-        for s in self.live_snakes:
-            if key not in s.player.all_keys:
+    def press_key(self, key: int):
+        for s, action in self.keymap.get(key, ()):
+            if not s.is_alive():
                 continue
-            if key in s.player.ctrl_up:
-                s.set_direction(Direction.UP)
-            elif key in s.player.ctrl_down:
-                s.set_direction(Direction.DOWN)
-            elif key in s.player.ctrl_left:
-                s.set_direction(Direction.LEFT)
-            elif key in s.player.ctrl_right:
-                s.set_direction(Direction.RIGHT)
-            elif key in s.player.ctrl_pause:
+            elif action == ACTION_PAUSE:
                 self.trigger_pause()
-            elif key in s.player.ctrl_boost:
+            elif action == ACTION_BOOST:
                 s.set_boost_moves_per_ms(SPEED_BOOST / 1000)
-            elif key in s.player.ctrl_shoot and s.has_bullets:
-                s.use_bullet()
-                self.sfx.bullet_fire.play()
-                self.fired_bullets.append(
-                    Bullet(self.util.get_xy_center(s.head),
-                           s.last_direction_moved, self.util))
+            elif action == ACTION_SHOOT:
+                if s.has_bullets:
+                    s.use_bullet()
+                    self.emit(Event.BULLET_FIRE)
+                    self.fired_bullets.fire(self.util.get_xy_center(s.head),
+                                            s.last_direction_moved)
+            else:
+                s.set_direction(action)
 
     def release_key(self, key: int):
-        for s in self.live_snakes:
-            if key in s.player.ctrl_boost:
+        for s in self.boost_keymap.get(key, ()):
+            if s.is_alive():
                 s.set_boost_moves_per_ms(0)
 
     def trigger_pause(self):
         self.paused = not self.paused
 
-    def get_free_tile(self, taken: np.ndarray) -> Coords:
-        tile = self.util.get_random_tile_not_taken(taken)
-        taken[tile[0]][tile[1]] = True
+    def occupy(self, tile: Coords) -> None:
+        if self.occupancy[tile] == 0:
+            self.free_tiles.take(tile)
+        self.occupancy[tile] += 1
+
+    def vacate(self, tile: Optional[Coords]) -> None:
+        if tile is not None:
+            self.occupancy[tile] -= 1
+            if self.occupancy[tile] == 0:
+                self.free_tiles.free(tile)
+
+    def get_free_tile(self) -> Optional[Coords]:
+        # None if the board is full
+        tile = self.free_tiles.pick(self.rng)
+        if tile is not None:
+            self.occupy(tile)
         return tile
 
-    def new_objects(self):
-        taken = np.zeros(self.game_size_tiles, dtype=bool)
+    def place_object(self, obj: int) -> Optional[Coords]:
+        # On a random free tile (None if the board is full)
+        tile = self.get_free_tile()
+        if tile is not None:
+            self.objects[tile] = obj
+        return tile
 
-        # Objects that will not change position
-        for snake in self.live_snakes:
-            for s in snake:
-                taken[s[0]][s[1]] = True
-        if not CLEAR_POWERUPS_IF_NOT_PICKED_UP:
-            for powerup in [self.pow_shield, self.pow_ghost,
-                            self.pow_bomb, self.pow_bullets]:
-                # Set to taken if powerup is not none
-                taken[powerup[0]][powerup[1]] = powerup is not None
-        if not CLEAR_SKULLS_EVERY_LEVEL:
-            for e in self.enemies:
-                taken[e[0]][e[1]] = True
-            for p in self.poisons:
-                taken[p[0]][p[1]] = True
-
-        # Clear previous objects
+    def remove_object(self, tile: Optional[Coords]) -> None:
+        if tile is not None:
+            self.objects[tile] = OBJ_NONE
+            self.vacate(tile)
+
+    def occupy_segment(self, tile: Coords) -> None:
+        self.segments[tile] += 1
+        self.occupy(tile)
+
+    def vacate_segment(self, tile: Optional[Coords]) -> None:
+        if tile is not None:
+            self.segments[tile] -= 1
+            self.vacate(tile)
+
+    def clear_powerups(self):
+        for powerup in [self.pow_shield, self.pow_ghost,
+                        self.pow_bomb, self.pow_bullets]:
+            self.remove_object(powerup)
+        self.pow_shield = self.pow_ghost = \
+            self.pow_bomb = self.pow_bullets = None
+
+    def clear_skulls(self):
+        for skull in self.enemies + self.poisons:
+            self.remove_object(skull)
+        self.enemies.clear()
+        self.poisons.clear()
+
+    def new_objects(self):
+        # Clear previous objects (remaining ones are already marked occupied)
+        self.remove_object(self.apple)
         if CLEAR_POWERUPS_IF_NOT_PICKED_UP:
-            self.pow_shield = self.pow_ghost = \
-                self.pow_bomb = self.pow_bullets = None
+            self.clear_powerups()
         if CLEAR_SKULLS_EVERY_LEVEL:
-            self.enemies.clear()
-            self.poisons.clear()
+            self.clear_skulls()
 
         # New apple
-        self.apple = self.get_free_tile(taken)
+        self.apple = self.place_object(OBJ_APPLE)
 
         # New shield powerup
         if self.should_spawn_shield():
-            self.pow_shield = self.get_free_tile(taken)
+            self.pow_shield = self.place_object(OBJ_SHIELD)
 
         # New ghost powerup
         if self.should_spawn_ghost():
-            self.pow_ghost = self.get_free_tile(taken)
+            self.pow_ghost = self.place_object(OBJ_GHOST)
 
         # New bomb powerup
         if self.should_spawn_bomb():
-            self.pow_bomb = self.get_free_tile(taken)
+            self.pow_bomb = self.place_object(OBJ_BOMB)
 
         # New bullets powerup
         if self.should_spawn_bullets():
-            self.pow_bullets = self.get_free_tile(taken)
+            self.pow_bullets = self.place_object(OBJ_BULLETS)
 
         # Mark front of snake taken to avoid immediately hitting enemies/poison
+        safe_zone = []
         for snake in self.live_snakes:
-            to_mark = snake.head
-            for i in range(SAFE_ZONE_TILES):
-                to_mark = self.util.get_next_tile(to_mark, snake.direction)
-                taken[to_mark[0]][to_mark[1]] = True
+            safe_zone += self.util.get_tiles_ahead(
+                snake.head, snake.direction, SAFE_ZONE_TILES)
+        for tile in safe_zone:
+            self.occupy(tile)
 
         # Match enemies list with expected number of enemies
         while len(self.enemies) < int(self.no_of_enemies):
-            self.enemies += [self.get_free_tile(taken)]
+            enemy = self.place_object(OBJ_ENEMY)
+            if enemy is None:
+                break
+            self.enemies.append(enemy)
         while len(self.enemies) > int(self.no_of_enemies):
-            self.enemies = self.enemies[:-1]
+            self.remove_object(self.enemies.pop())
 
         # Match poisons list with expected number of poisons
         while len(self.poisons) < int(self.no_of_poisons):
-            self.poisons += [self.get_free_tile(taken)]
+            poison = self.place_object(OBJ_POISON)
+            if poison is None:
+                break
+            self.poisons.append(poison)
         while len(self.poisons) > int(self.no_of_poisons):
-            self.poisons = self.poisons[:-1]
+            self.remove_object(self.poisons.pop())
 
-    def check_snake_hits(self, snake: Snake, other_snakes: List[Snake]):
+        # Unmark front of snake
+        for tile in safe_zone:
+            self.vacate(tile)
+
+    def check_snake_hits(self, snake: Snake):
         # Check if hit itself, apple, power-ups
         head = snake.head
-        if head in snake.tail and not snake.is_ghost_on:
+        on_head = self.objects[head]
+        if snake.is_in_tail(head) and not snake.is_ghost_on:
             snake.kill()
             return
-        elif head == self.apple:
+        elif on_head == OBJ_APPLE:
             self.level += 1
             snake.grow_by_one()
+            self.occupy_segment(snake.tip)
             self.update_snakes_moves_per_ms()
             self.new_objects()
-            self.sfx.apple.play()
-        elif head == self.pow_shield:
+            self.emit(Event.APPLE)
+        elif on_head == OBJ_SHIELD:
             snake.set_shield(True)
+            self.remove_object(self.pow_shield)
             self.pow_shield = None
-            self.sfx.powerup.play()
-        elif head == self.pow_ghost:
+            self.emit(Event.POWERUP)
+        elif on_head == OBJ_GHOST:
             snake.set_ghost(GHOST_TIMER_MS)
+            self.remove_object(self.pow_ghost)
             self.pow_ghost = None
-            self.sfx.powerup.play()
-        elif head == self.pow_bomb:
+            self.emit(Event.POWERUP)
+        elif on_head == OBJ_BOMB:
             self.minus_enemies += self.no_of_enemies
             self.minus_poisons += self.no_of_poisons
-            self.enemies.clear()
-            self.poisons.clear()
+            self.clear_skulls()
+            for powerup in [self.pow_shield, self.pow_ghost, self.pow_bomb]:
+                self.remove_object(powerup)
             self.pow_shield = self.pow_ghost = self.pow_bomb = None
-            self.sfx.powerup.play()
-        elif head == self.pow_bullets:
+            self.emit(Event.POWERUP)
+        elif on_head == OBJ_BULLETS:
             snake.add_bullets(INIT_NO_OF_BULLETS)
+            self.remove_object(self.pow_bullets)
             self.pow_bullets = None
-            self.sfx.powerup.play()
+            self.emit(Event.POWERUP)
 
-        # Check if hit other snake
-        if not snake.is_ghost_on:
-            for s in other_snakes:
-                if head in s:
-                    snake.kill()
-                    return
+        if snake.is_ghost_on:
+            return
+
+        # Check if hit other snake (any segments on the tile but its own)
+        if self.segments[head] > snake.counts[head]:
+            snake.kill()
+            return
 
         # Check if hit enemy
-        if not snake.is_ghost_on:
-            try:
-                self.enemies.remove(next(e for e in self.enemies if e == head))
-                if snake.is_shield_on:
-                    snake.set_shield(False)
-                    self.sfx.shield_off.play()
-                else:
-                    snake.kill()
-                    return
-            except StopIteration:
-                pass
+        on_head = self.objects[head]
+        if on_head == OBJ_ENEMY:
+            self.enemies.remove(head)
+            self.remove_object(head)
+            if snake.is_shield_on:
+                snake.set_shield(False)
+                self.emit(Event.SHIELD_OFF)
+            else:
+                snake.kill()
+                return
 
         # Check if hit poison
-        if not snake.is_ghost_on:
-            try:
-                self.poisons.remove(next(e for e in self.poisons if e == head))
-                if snake.is_shield_on:
-                    snake.set_shield(False)
-                    self.sfx.shield_off.play()
+        elif on_head == OBJ_POISON:
+            self.poisons.remove(head)
+            self.remove_object(head)
+            if snake.is_shield_on:
+                snake.set_shield(False)
+                self.emit(Event.SHIELD_OFF)
+            else:
+                self.vacate_segment(snake.tip)
+                snake.shrink(1)
+                if len(snake) < 1:
+                    snake.kill()
+                    return
                 else:
-                    snake.shrink(1)
-                    if len(snake) < 1:
-                        snake.kill()
-                        return
-                    else:
-                        self.sfx.poison.play()
-            except StopIteration:
-                pass
+                    self.emit(Event.POISON)
 
     def check_bullet_hits(self):
-        # Check if bullets hit an enemy, poison, or snake
-        hits = []
-        for b in self.fired_bullets:
-            bullet_tile = self.util.get_xy_tile(b.coords)
-            if bullet_tile in self.enemies:
-                hits.append(b)
+        # Check if bullets hit an enemy, poison, or snake on any tile they
+        # crossed (only tiles with something on them can be hit); each
+        # bullet stops at the first tile where it hits something
+        hits = np.zeros(len(self.fired_bullets), dtype=bool)
+        for b, bullet_tile in self.fired_bullets.get_swept_occupied_tiles(
+                self.occupancy):
+            if hits[b]:
+                continue
+            on_tile = self.objects[bullet_tile]
+            if on_tile == OBJ_ENEMY:
+                hits[b] = True
                 self.enemies.remove(bullet_tile)
+                self.remove_object(bullet_tile)
                 self.minus_enemies += 1
-                self.sfx.bullet_hit_skull.play()
-            elif bullet_tile in self.poisons:
-                hits.append(b)
+                self.emit(Event.BULLET_HIT_SKULL)
+            elif on_tile == OBJ_POISON:
+                hits[b] = True
                 self.poisons.remove(bullet_tile)
+                self.remove_object(bullet_tile)
                 self.minus_poisons += 1
-                self.sfx.bullet_hit_skull.play()
-            else:
+                self.emit(Event.BULLET_HIT_SKULL)
+            elif self.segments[bullet_tile] > 0:
                 # For bullet hit to count, it has to have hit the snake (excl.
                 # its head) and the snake has to not be a ghost
                 for s in self.live_snakes:
                     if not s.is_ghost_on and bullet_tile != s.head and \
-                            bullet_tile in s.coords:
-                        hits.append(b)
+                            bullet_tile in s:
+                        hits[b] = True
                         if s.is_shield_on:
                             s.set_shield(False)
-                            self.sfx.shield_off.play()
+                            self.emit(Event.SHIELD_OFF)
                         else:
+                            self.vacate_segment(s.tip)
                             s.shrink(1)
-                            self.sfx.bullet_hit_snake.play()
+                            self.emit(Event.BULLET_HIT_SNAKE)
 
         # Hits means bullet can be removed
-        for h in hits:
-            self.fired_bullets.remove(h)
+        self.fired_bullets.remove(hits)
 
     def move(self, dt: int):
         # Progress snakes' time and move
@@ -311,19 +421,23 @@ class Game:
         for s in self.live_snakes:
             s.move_time(dt)
             if s.can_move():
+                self.vacate_segment(s.tip)
                 s.move()
+                self.occupy_segment(s.head)
                 any_snake_moved = True
 
         # Once any snakes moved, if any, check hits
         if any_snake_moved:
             # Check if snake hit something
-            for i, snake in enumerate(self.live_snakes):
-                other_snakes = self.live_snakes[0:i] + \
-                               self.live_snakes[i + 1:len(self.live_snakes)]
-                self.check_snake_hits(snake, other_snakes)
+            for snake in self.live_snakes:
+                self.check_snake_hits(snake)
 
             # Exclude any dead snakes from game
             before = len(self.live_snakes)
+            for snake in self.live_snakes:
+                if not snake.is_alive():
+                    for s in snake:
+                        self.vacate_segment(s)
             self.live_snakes = [s for s in self.live_snakes if s.is_alive()]
             after = len(self.live_snakes)
 
@@ -331,17 +445,25 @@ class Game:
             if len(self.live_snakes) == 0:
                 self.game_over = True
             elif after < before:
-                self.sfx.snake_death.play()
-
-        # Remove bullets if out of screen
-        bullets_to_remove = [b for b in self.fired_bullets
-                             if self.util.is_xy_out_of_screen(b.coords)]
-        for b in bullets_to_remove:
-            self.fired_bullets.remove(b)
-
-        # Move bullets
-        for b in self.fired_bullets:
-            b.move(dt)
-
-        # Check if bullets hit something
-        self.check_bullet_hits()
+                self.emit(Event.SNAKE_DEATH)
+
+        # Remove bullets if out of screen, move the rest and check if they
+        # hit something
+        if len(self.fired_bullets) > 0:
+            self.fired_bullets.remove(self.fired_bullets.get_out_of_screen())
+            self.fired_bullets.move(dt)
+            self.check_bullet_hits()
+
+    def step(self, dt: int, inputs: Iterable[KeyInput] = ()) -> List[Event]:
+        # Apply key inputs, advance game (unless paused) and collect events
+        if self.recorder is not None:
+            inputs = list(inputs)
+            self.recorder.add_step(dt, inputs)
+        for key, pressed in inputs:
+            if pressed:
+                self.press_key(key)
+            else:
+                self.release_key(key)
+        if not self.paused:
+            self.move(dt)
+        return self.pop_events()
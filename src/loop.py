@@ -3,12 +3,16 @@ from pygame.time import Clock
 
 from src.drawer import Drawer
 from src.game import Game
+from src.net import Connection, RemoteGame
 from src.utils.config import Config
 from src.utils.score import ScoresList
 from src.utils.sfx import SfxHolder
 from src.utils.text import Text
+from src.utils.timings import FrameTimings
 from src.utils.util import Util, user_quit
 
+MAX_TICKS_PER_FRAME = 10  # fixed-timestep ticks; more are dropped (lag)
+
 
 class Loop:
     def __init__(self, util: Util, cfg: Config, sfx: SfxHolder, txt: Text,
@@ -20,13 +24,32 @@ class Loop:
         self.drawer = drawer
         self.clock = Clock()
 
+        # Per-frame phase timings (shown over the game) if set
+        self.timings = None
+        if cfg.frame_timings:
+            self.set_timings(FrameTimings())
+
+    def set_timings(self, timings: FrameTimings):
+        self.timings = timings
+        self.drawer.timings = timings
+
+    def mark(self, phase: str):
+        if self.timings is not None:
+            self.timings.mark(phase)
+
     def main(self, screen, game: Game) -> bool:
         # Dump first tick to ignore past
         self.clock.tick(self.cfg.frames_per_second)
 
+        # Inputs and time not yet simulated (fixed-timestep mode)
+        inputs = []
+        accumulated_ms = 0
+
         while True:
             # Get change in time
             dt = self.clock.tick(self.cfg.frames_per_second)
+            if self.timings is not None:
+                self.timings.start_frame(dt)
 
             # Loop over events (quit, key down, key up)
             for event in pg.event.get():
@@ -34,28 +57,90 @@ class Loop:
                     return False
                 elif event.type == pg.KEYDOWN:
                     if event.key in self.cfg.all_keys:
-                        game.press_key(event.key)
+                        inputs.append((event.key, True))
                 elif event.type == pg.KEYUP:
                     if event.key in self.cfg.all_keys:
-                        game.release_key(event.key)
-
-            # Move and draw game (with possible paused screen and fps)
-            if not game.paused:
-                game.move(dt)
-            if not game.game_over:
-                self.drawer.draw_game(screen, game, dt)
-            if game.paused:
-                self.drawer.draw_paused_overlay(screen)
-            if self.cfg.draw_fps:
-                self.drawer.draw_fps(screen, self.clock.get_fps())
-
-            # Update display
-            pg.display.update()
+                        inputs.append((event.key, False))
+            self.mark('events')
+
+            # Step game (unless paused) and play resulting sound effects;
+            # in fixed-timestep mode as many whole ticks as time has passed
+            alpha = 1.0
+            tick_ms = self.cfg.tick_ms
+            if tick_ms == 0:
+                self.sfx.play_events(game.step(dt, inputs))
+                inputs = []
+            else:
+                accumulated_ms = min(accumulated_ms + dt,
+                                     MAX_TICKS_PER_FRAME * tick_ms)
+                while accumulated_ms >= tick_ms and not game.game_over:
+                    self.sfx.play_events(game.step(tick_ms, inputs))
+                    inputs = []
+                    accumulated_ms -= tick_ms
+                if self.cfg.interpolate_bullets and not game.paused:
+                    alpha = accumulated_ms / tick_ms
+            self.mark('step')
+
+            self.draw_frame(screen, game, dt, alpha)
 
             # Break if game no longer running
             if game.game_over:
                 return True
 
+    def main_remote(self, screen, client: RemoteGame,
+                    connection: Connection) -> bool:
+        # Like main(), but the game is stepped by a server: key presses are
+        # sent to it and the ticks (or changes, if only watching) it sends
+        # back are applied as they arrive
+        self.clock.tick(self.cfg.frames_per_second)
+        game = client.game
+
+        while True:
+            dt = self.clock.tick(self.cfg.frames_per_second)
+            if self.timings is not None:
+                self.timings.start_frame(dt)
+
+            for event in pg.event.get():
+                if user_quit(event):
+                    return False
+                elif event.type in [pg.KEYDOWN, pg.KEYUP]:
+                    data = client.encode_key(event.key,
+                                             event.type == pg.KEYDOWN)
+                    if data is not None:
+                        connection.send(data)
+            self.mark('events')
+
+            for msg_type, payload in connection.get_messages():
+                self.sfx.play_events(client.apply(msg_type, payload))
+            self.mark('step')
+
+            self.draw_frame(screen, game, dt)
+
+            # Break if game over or the server has gone
+            if game.game_over or connection.closed:
+                return True
+
+    def draw_frame(self, screen, game: Game, dt: int, alpha: float = 1.0):
+        # Draw game (with possible paused screen and fps)
+        if not game.game_over:
+            self.drawer.draw_game(screen, game, dt, alpha)
+        if game.paused:
+            self.drawer.draw_paused_overlay(screen)
+        if self.cfg.draw_fps:
+            self.drawer.draw_fps(screen, self.clock.get_fps())
+        if self.timings is not None:
+            self.drawer.draw_timings(screen, self.timings)
+        self.mark('overlays')
+
+        # Update display (only changed areas in dirty-rectangle mode)
+        if self.cfg.dirty_rects:
+            pg.display.update(self.drawer.pop_dirty_rects())
+        else:
+            pg.display.update()
+        if self.timings is not None:
+            self.mark('update')
+            self.timings.end_frame()
+
     def game_over(self, screen, game: Game, scores: ScoresList) -> bool:
         score_saved = False  # not saved yet
         self.sfx.game_over.play()  # play audio
@@ -65,6 +150,7 @@ class Loop:
             # Fade-in game over screen
             if i < 256:
                 pg.event.get()  # dummy get
+                self.drawer.invalidate()  # overlay needs full game redrawn
                 self.drawer.draw_game(screen, game, 0)  # draw game
                 self.drawer.draw_game_over_overlay(
                     screen, i, score_saved)  # fade-in game over screen
@@ -0,0 +1,239 @@
+import queue
+import socket
+import struct
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+
+from src.events import Event
+from src.game import Game, KeyInput
+from src.replay import HEADER, NAME_LENGTH, STEP, KEY_INPUT, \
+    get_controls, get_state_digest
+from src.snapshot import decode_snapshot, apply_delta, restore, new_game
+from src.utils.config import Config, Player
+from src.utils.tiles import Tiles
+
+PROTOCOL_VERSION = 1
+DEFAULT_PORT = 5858
+
+# Every message is its type and payload size, then the payload
+MESSAGE = struct.Struct('<BI')
+MSG_JOIN = 0  # client: protocol version, player name
+MSG_START = 1  # server: game header, own slot, players' names
+MSG_KEY = 2  # client: action pressed or released
+MSG_STEP = 3  # server: dt and key inputs of one tick
+MSG_DIGEST = 4  # server: tick number and state digest after it
+MSG_WATCH = 5  # client: protocol version
+MSG_SNAPSHOT = 6  # server: snapshot of the game watched
+MSG_DELTA = 7  # server: changes to it since the last snapshot or delta
+
+VERSION = struct.Struct('<H')
+SLOT = struct.Struct('<BB')  # own slot, number of players
+KEY = struct.Struct('<B?')  # action (index into get_controls()), pressed
+TICK = struct.Struct('<I')
+
+# Actions in the order of get_controls(); pausing is not sent, as it would
+# stall everybody else's game
+NO_OF_ACTIONS = 7
+ACTION_PAUSE = 4
+
+Message = Tuple[int, bytes]
+
+
+def encode(msg_type: int, payload: bytes = b'') -> bytes:
+    return MESSAGE.pack(msg_type, len(payload)) + payload
+
+
+def encode_step(dt: int, inputs: List[KeyInput]) -> bytes:
+    payload = bytearray(STEP.pack(dt, len(inputs)))
+    for key, pressed in inputs:
+        payload += KEY_INPUT.pack(key, pressed)
+    return encode(MSG_STEP, bytes(payload))
+
+
+def decode_step(payload: bytes) -> Tuple[int, List[KeyInput]]:
+    dt, no_of_inputs = STEP.unpack_from(payload)
+    return dt, [KEY_INPUT.unpack_from(payload, STEP.size + i * KEY_INPUT.size)
+                for i in range(no_of_inputs)]
+
+
+def get_net_key(slot: int, action: int) -> int:
+    # Keys of remote players are negative, so never clash with real ones
+    return -1 - slot * NO_OF_ACTIONS - action
+
+
+def get_net_player(name: str, slot: int) -> Player:
+    return Player(name, *[{get_net_key(slot, action)}
+                          if action != ACTION_PAUSE else set()
+                          for action in range(NO_OF_ACTIONS)])
+
+
+def new_net_game(tiles: Tiles, names: List[str],
+                 seed: Optional[int] = None) -> Game:
+    # Only the players are needed from the config (as for replays)
+    cfg = Config('')
+    cfg.players = [get_net_player(name, i) for i, name in enumerate(names)]
+    cfg.all_keys = set().union(*[p.all_keys for p in cfg.players])
+    return Game(tiles, cfg, (tiles.tiles_x, tiles.tiles_y), seed)
+
+
+def encode_start(game: Game, slot: int) -> bytes:
+    payload = bytearray(HEADER.pack(
+        PROTOCOL_VERSION, game.seed, game.util.width_px,
+        game.util.height_px, *game.game_size_tiles))
+    payload += SLOT.pack(slot, len(game.all_snakes))
+    for snake in game.all_snakes:
+        name = snake.player.name.encode()
+        payload += NAME_LENGTH.pack(len(name)) + name
+    return encode(MSG_START, bytes(payload))
+
+
+def encode_digest(tick: int, game: Game) -> bytes:
+    return encode(MSG_DIGEST, TICK.pack(tick) + get_state_digest(game))
+
+
+class Client:
+    # A copy of a game run by a server, kept in step by applying the ticks
+    # it sends (the game is deterministic, so only inputs are sent) and
+    # checked against the digests it sends now and then
+
+    def __init__(self, start_payload: bytes):
+        version, seed, width_px, height_px, tiles_x, tiles_y = \
+            HEADER.unpack_from(start_payload)
+        if version != PROTOCOL_VERSION:
+            raise Exception('Unsupported protocol version: {}'
+                            ''.format(version))
+        offset = HEADER.size
+        self.slot, no_of_players = SLOT.unpack_from(start_payload, offset)
+        offset += SLOT.size
+        names = []
+        for _ in range(no_of_players):
+            name_length = NAME_LENGTH.unpack_from(start_payload, offset)[0]
+            offset += NAME_LENGTH.size
+            names.append(
+                start_payload[offset:offset + name_length].decode())
+            offset += name_length
+
+        tiles = Tiles((width_px, height_px), (tiles_x, tiles_y))
+        self.game = new_net_game(tiles, names, seed)
+        self.tick = 0
+        self.actions: Dict[int, int] = {}  # local key -> action
+
+    def bind_keys(self, player: Player):
+        # Control own snake with a local player's keys
+        self.actions = {key: action
+                        for action, keys in enumerate(get_controls(player))
+                        for key in keys if action != ACTION_PAUSE}
+
+    def encode_key(self, key: int, pressed: bool) -> Optional[bytes]:
+        action = self.actions.get(key)
+        if action is None:
+            return None
+        return encode(MSG_KEY, KEY.pack(action, pressed))
+
+    def apply(self, msg_type: int, payload: bytes) -> List[Event]:
+        if msg_type == MSG_STEP:
+            self.tick += 1
+            return self.game.step(*decode_step(payload))
+        elif msg_type == MSG_DIGEST:
+            tick = TICK.unpack_from(payload)[0]
+            if tick != self.tick or \
+                    payload[TICK.size:] != get_state_digest(self.game):
+                raise Exception('Out of sync with server at tick {}'
+                                ''.format(tick))
+            return []
+        raise Exception('Unexpected message type: {}'.format(msg_type))
+
+
+class Watcher:
+    # A copy of a game watched on a server, which sends a snapshot of it
+    # and then its changes every tick (so it can be watched at any point);
+    # used like a Client, but without key presses or sound effects
+
+    def __init__(self, snapshot_payload: bytes):
+        self.snapshot = decode_snapshot(snapshot_payload)
+        self.game = new_game(self.snapshot)
+
+    def bind_keys(self, player: Player):
+        pass
+
+    def encode_key(self, key: int, pressed: bool) -> Optional[bytes]:
+        return None
+
+    def apply(self, msg_type: int, payload: bytes) -> List[Event]:
+        if msg_type != MSG_DELTA:
+            raise Exception('Unexpected message type: {}'.format(msg_type))
+        self.snapshot = apply_delta(self.snapshot, payload)
+        restore(self.game, self.snapshot)
+        return []
+
+
+RemoteGame = Union[Client, Watcher]
+
+
+class Connection:
+    # Blocking connection to a server for clients with their own main loop
+    # (e.g. pygame's); once started, messages are read on a thread and
+    # picked up with get_messages()
+
+    def __init__(self, host: str, port: int = DEFAULT_PORT):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.sock.makefile('rb')
+        self.messages = queue.Queue()
+        self.closed = False  # by the server
+
+    def send(self, data: bytes):
+        self.sock.sendall(data)
+
+    def join(self, name: str) -> Client:
+        # Wait for a game to start
+        self.send(encode(MSG_JOIN, VERSION.pack(PROTOCOL_VERSION) +
+                         name.encode()))
+        message = self.read_message()
+        if message is None or message[0] != MSG_START:
+            raise Exception('Server did not start a game')
+        return Client(message[1])
+
+    def watch(self) -> Watcher:
+        # Wait for a game to watch
+        self.send(encode(MSG_WATCH, VERSION.pack(PROTOCOL_VERSION)))
+        message = self.read_message()
+        if message is None or message[0] != MSG_SNAPSHOT:
+            raise Exception('Server did not send a game to watch')
+        return Watcher(message[1])
+
+    def read_message(self) -> Optional[Message]:
+        header = self.file.read(MESSAGE.size)
+        if len(header) < MESSAGE.size:
+            return None
+        msg_type, size = MESSAGE.unpack(header)
+        payload = self.file.read(size)
+        if len(payload) < size:
+            return None
+        return msg_type, payload
+
+    def start_reading(self):
+        def read_all():
+            try:
+                while True:
+                    message = self.read_message()
+                    self.messages.put(message)
+                    if message is None:
+                        return
+            except OSError:
+                self.messages.put(None)
+
+        threading.Thread(target=read_all, daemon=True).start()
+
+    def get_messages(self) -> List[Message]:
+        messages = []
+        while not self.messages.empty():
+            message = self.messages.get()
+            if message is None:
+                self.closed = True
+            else:
+                messages.append(message)
+        return messages
+
+    def close(self):
+        self.sock.close()
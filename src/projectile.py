@@ -1,33 +1,135 @@
-from src.utils.util import Coords, Direction, get_next_xy, Util
+from typing import List, Tuple
+
+import numpy as np
+
+from src.utils.direction import Direction
+from src.utils.tiles import Coords, Tiles
 
 BULLET_TILES_PER_SECOND = 30
+INIT_CAPACITY = 16  # projectiles before the pool's arrays are grown
 
+# Pixel step (x, y) per direction
+DIRECTION_STEPS = {
+    Direction.UP: (0, -1),
+    Direction.DOWN: (0, 1),
+    Direction.LEFT: (-1, 0),
+    Direction.RIGHT: (1, 0),
+}
 
-class Projectile:
 
-    def __init__(self, coords: Coords, direction: Direction,
-                 tiles_per_second: float, util: Util):
-        self.coords = coords
-        self.direction = direction
+class Projectiles:
+    # Pool of projectiles moving in straight lines at a constant speed, held
+    # as arrays (first count rows in use, in order fired). Positions are
+    # worked out from the time since firing rather than pixel by pixel, so
+    # moving all of them is a handful of array operations.
+
+    def __init__(self, tiles_per_second: float, util: Tiles):
+        self.util = util
 
         tpms = tiles_per_second / 1000  # tiles per ms
-        ppms = tpms * util.tile_width_px  # pixels per ms
-        self.mspp = 1 / ppms  # ms per pixel
+        self.ppms = tpms * util.tile_width_px  # pixels per ms
+
+        self.count = 0
+        self.origins = np.zeros((INIT_CAPACITY, 2), dtype=int)
+        self.steps = np.zeros((INIT_CAPACITY, 2), dtype=int)
+        self.times = np.zeros(INIT_CAPACITY)  # ms since fired
+        self.coords = np.zeros((INIT_CAPACITY, 2), dtype=int)
+        self.prev_coords = np.zeros((INIT_CAPACITY, 2), dtype=int)
+
+        # Pixel to tile lookups (as in Tiles) for indexing with arrays
+        self.px_tile_x = np.array(util.px_tile_x)
+        self.px_tile_y = np.array(util.px_tile_y)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def grow(self) -> None:
+        def grown(a: np.ndarray) -> np.ndarray:
+            return np.concatenate([a, np.zeros_like(a)])
+
+        self.origins = grown(self.origins)
+        self.steps = grown(self.steps)
+        self.times = grown(self.times)
+        self.coords = grown(self.coords)
+        self.prev_coords = grown(self.prev_coords)
+
+    def fire(self, coords: Coords, direction: Direction) -> None:
+        if self.count == len(self.times):
+            self.grow()
+        i = self.count
+        self.origins[i] = self.coords[i] = self.prev_coords[i] = coords
+        self.steps[i] = DIRECTION_STEPS[direction]
+        self.times[i] = 0
+        self.count += 1
+
+    def remove(self, mask: np.ndarray) -> None:
+        # Remove projectiles where mask (one per projectile) is True
+        if not mask.any():
+            return
+        keep = np.flatnonzero(~mask)
+        for a in [self.origins, self.steps, self.times,
+                  self.coords, self.prev_coords]:
+            a[:len(keep)] = a[keep]
+        self.count = len(keep)
+
+    def move(self, dt: int) -> None:
+        # Whole pixels moved by each is the number of pixel-durations that
+        # have fully passed since it was fired (rounded first so that float
+        # error cannot tip an exact multiple over)
+        n = self.count
+        self.prev_coords[:n] = self.coords[:n]
+        self.times[:n] += dt
+        px = np.ceil(np.round(self.times[:n] * self.ppms, 9)) - 1
+        px = np.maximum(px, 0)
+        self.coords[:n] = self.origins[:n] + \
+            self.steps[:n] * px.astype(int)[:, np.newaxis]
+
+    def get_out_of_screen(self) -> np.ndarray:
+        x, y = self.coords[:self.count].T
+        return (x < 0) | (x > self.util.width_px) | \
+               (y < 0) | (y > self.util.height_px)
+
+    def get_board_tiles(self, coords: np.ndarray) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        # Tile of each position, clamped to the board (positions past an
+        # edge count as the tile at that edge)
+        x = np.clip(coords[:, 0], 0, self.util.width_px)
+        y = np.clip(coords[:, 1], 0, self.util.height_px)
+        tile_x = np.minimum(self.px_tile_x[x], self.util.tiles_x - 1)
+        tile_y = np.minimum(self.px_tile_y[y], self.util.tiles_y - 1)
+        return tile_x, tile_y
 
-        self.time = 0
+    def get_swept_occupied_tiles(self, occupancy: np.ndarray) \
+            -> List[Tuple[int, Coords]]:
+        # (Index, tile) for every tile each entered during the last move
+        # that has anything on it, in the order fired and then in the order
+        # crossed, so fast ones cannot skip over tiles. The start tile is
+        # left out: it was checked when entered, or is the tile fired from
+        # (the shooter's head, or its neck once it has moved on).
+        n = self.count
+        start_x, start_y = self.get_board_tiles(self.prev_coords[:n])
+        end_x, end_y = self.get_board_tiles(self.coords[:n])
+        lengths = np.abs(end_x - start_x) + np.abs(end_y - start_y)
 
-    def move(self, dt: int):
-        self.time += dt
+        # One row per (projectile, tile crossed)
+        index = np.repeat(np.arange(n), lengths)
+        first_row = np.cumsum(lengths) - lengths
+        offset = np.arange(len(index)) - np.repeat(first_row, lengths) + 1
+        step = self.steps[:n][index]
+        tile_x = start_x[index] + step[:, 0] * offset
+        tile_y = start_y[index] + step[:, 1] * offset
 
-        px = 0
-        while self.time > self.mspp:
-            self.time -= self.mspp
-            px += 1
+        on = np.flatnonzero(occupancy[tile_x, tile_y] > 0)
+        return list(zip(index[on].tolist(), zip(tile_x[on].tolist(),
+                                                tile_y[on].tolist())))
 
-        if px > 0:
-            self.coords = get_next_xy(self.coords, self.direction, px)
+    def get_xys(self, alpha: float = 1.0) -> List[Coords]:
+        # Positions alpha of the way through the last move
+        prev = self.prev_coords[:self.count]
+        xys = prev + (self.coords[:self.count] - prev) * alpha
+        return [tuple(xy) for xy in np.rint(xys).astype(int).tolist()]
 
 
-class Bullet(Projectile):
-    def __init__(self, coords: Coords, direction: Direction, util: Util):
-        super().__init__(coords, direction, BULLET_TILES_PER_SECOND, util)
+class Bullets(Projectiles):
+    def __init__(self, util: Tiles):
+        super().__init__(BULLET_TILES_PER_SECOND, util)
@@ -0,0 +1,160 @@
+import hashlib
+import struct
+import zlib
+from typing import List, Tuple
+
+from src.game import Game, KeyInput
+from src.utils.config import Config, Keys, Player
+from src.utils.tiles import Size2D, Tiles
+
+REPLAY_MAGIC = b'PYSNAKE\x00'
+REPLAY_VERSION = 1
+
+# Little-endian records (everything after the magic is zlib-compressed)
+HEADER = struct.Struct('<HQIIII')  # version, seed, width/height px and tiles
+COUNT = struct.Struct('<I')
+NAME_LENGTH = struct.Struct('<H')
+KEY = struct.Struct('<i')
+STEP = struct.Struct('<IB')  # dt (ms), number of key inputs
+KEY_INPUT = struct.Struct('<i?')  # key, True if pressed
+DIGEST_SIZE = 20  # sha1
+
+Step = Tuple[int, List[KeyInput]]
+
+
+def get_state_digest(game: Game) -> bytes:
+    # Fingerprint of everything that decides how the game goes on
+    snakes = [(s.is_alive(), list(s), s.last_direction_moved.value,
+               list(d.value for d in s.turns), s.bullets, s.is_shield_on,
+               s.ghost_ms, s.ms_idle, s.max_length_reached)
+              for s in game.all_snakes]
+    state = (game.level, game.game_over, game.paused, snakes, game.apple,
+             game.pow_shield, game.pow_ghost, game.pow_bomb,
+             game.pow_bullets, game.enemies, game.poisons,
+             game.fired_bullets.get_xys(), game.rng.getstate())
+    return hashlib.sha1(repr(state).encode()).digest()
+
+
+def get_controls(player: Player) -> List[Keys]:
+    return [player.ctrl_up, player.ctrl_down, player.ctrl_left,
+            player.ctrl_right, player.ctrl_pause, player.ctrl_boost,
+            player.ctrl_shoot]
+
+
+def pack_players(players: List[Player]) -> bytes:
+    # Names and key bindings
+    data = bytearray(COUNT.pack(len(players)))
+    for player in players:
+        name = player.name.encode()
+        data += NAME_LENGTH.pack(len(name)) + name
+        for keys in get_controls(player):
+            data += COUNT.pack(len(keys))
+            for key in sorted(keys):
+                data += KEY.pack(key)
+    return bytes(data)
+
+
+def unpack_players(data: bytes, offset: int) -> Tuple[List[Player], int]:
+    # Players packed at offset, and the offset after them
+    def read(record: struct.Struct) -> int:
+        nonlocal offset
+        value = record.unpack_from(data, offset)[0]
+        offset += record.size
+        return value
+
+    players = []
+    for _ in range(read(COUNT)):
+        name_length = read(NAME_LENGTH)
+        name = bytes(data[offset:offset + name_length]).decode()
+        offset += name_length
+        controls = [{read(KEY) for _ in range(read(COUNT))}
+                    for _ in range(7)]
+        players.append(Player(name, *controls))
+    return players, offset
+
+
+class Recorder:
+    # Records what a game needs to be re-simulated exactly: its seed, size
+    # and players, and the dt and key inputs of every step. Set as
+    # Game.recorder, which then adds each step.
+
+    def __init__(self, game: Game):
+        self.game = game
+        self.no_of_steps = 0
+        self.steps = bytearray()
+
+    def add_step(self, dt: int, inputs: List[KeyInput]) -> None:
+        if dt != int(dt):
+            raise Exception('Only whole-millisecond steps can be recorded')
+        self.steps += STEP.pack(int(dt), len(inputs))
+        for key, pressed in inputs:
+            self.steps += KEY_INPUT.pack(key, pressed)
+        self.no_of_steps += 1
+
+    def write(self, replay_file: str) -> None:
+        game = self.game
+        data = bytearray(HEADER.pack(
+            REPLAY_VERSION, game.seed, game.util.width_px,
+            game.util.height_px, *game.game_size_tiles))
+        data += pack_players([s.player for s in game.all_snakes])
+        data += COUNT.pack(self.no_of_steps) + self.steps
+        data += get_state_digest(game)
+
+        with open(replay_file, 'wb') as f:
+            f.write(REPLAY_MAGIC + zlib.compress(bytes(data)))
+
+
+class Replay:
+    def __init__(self, replay_file: str):
+        with open(replay_file, 'rb') as f:
+            raw = f.read()
+        if not raw.startswith(REPLAY_MAGIC):
+            raise Exception('Not a replay file: {}'.format(replay_file))
+        data = zlib.decompress(raw[len(REPLAY_MAGIC):])
+        offset = 0
+
+        def read(record: struct.Struct) -> tuple:
+            nonlocal offset
+            values = record.unpack_from(data, offset)
+            offset += record.size
+            return values
+
+        version, self.seed, width_px, height_px, tiles_x, tiles_y = \
+            read(HEADER)
+        if version != REPLAY_VERSION:
+            raise Exception('Unsupported replay version: {}'.format(version))
+        self.game_size_pixels: Size2D = (width_px, height_px)
+        self.game_size_tiles: Size2D = (tiles_x, tiles_y)
+
+        self.players, offset = unpack_players(data, offset)
+
+        self.steps: List[Step] = []
+        for _ in range(read(COUNT)[0]):
+            dt, no_of_inputs = read(STEP)
+            self.steps.append(
+                (dt, [read(KEY_INPUT) for _ in range(no_of_inputs)]))
+
+        self.digest = data[offset:offset + DIGEST_SIZE]
+
+    @property
+    def duration_ms(self) -> int:
+        return sum(dt for dt, _ in self.steps)
+
+    def new_game(self) -> Game:
+        # Only the players are needed from the config
+        cfg = Config('')
+        cfg.players = self.players
+        cfg.all_keys = set().union(*[p.all_keys for p in self.players])
+        tiles = Tiles(self.game_size_pixels, self.game_size_tiles)
+        return Game(tiles, cfg, self.game_size_tiles, self.seed)
+
+    def play(self) -> Game:
+        # Re-simulate every step (as fast as possible)
+        game = self.new_game()
+        for dt, inputs in self.steps:
+            game.step(dt, inputs)
+        return game
+
+    def verify(self, game: Game) -> bool:
+        # Whether a played game ended in the recorded state
+        return get_state_digest(game) == self.digest
@@ -0,0 +1,246 @@
+import asyncio
+import struct
+import time
+from typing import List, Optional
+
+from src.net import MESSAGE, MSG_JOIN, MSG_KEY, MSG_WATCH, MSG_SNAPSHOT, \
+    MSG_DELTA, VERSION, KEY, PROTOCOL_VERSION, NO_OF_ACTIONS, ACTION_PAUSE, \
+    DEFAULT_PORT, encode, encode_start, encode_step, encode_digest, \
+    get_net_key, new_net_game
+from src.snapshot import get_snapshot, encode_snapshot, get_delta
+from src.utils.tiles import Tiles
+
+SERVER_TICK_MS = 16  # simulated milliseconds per tick, unless configured
+MAX_TICKS_BEHIND = 10  # ticks caught up on at once; more are dropped (lag)
+DIGEST_EVERY_TICKS = 60  # state digests sent for clients to check against
+MAX_WRITE_BUFFER = 1 << 20  # bytes queued for a client before it is dropped
+MAX_NAME_LENGTH = 64  # bytes
+MAX_INPUTS_PER_TICK = 8  # per player; more are dropped (3 turns can queue)
+MAX_MESSAGE_SIZE = 1024  # bytes; clients only send joins and keys
+STATS_EVERY_S = 10
+
+
+class RemotePlayer:
+    def __init__(self, name: str, writer: asyncio.StreamWriter):
+        self.name = name
+        self.writer = writer
+        self.match: Optional[Match] = None
+        self.slot = 0
+
+    def send(self, data: bytes):
+        # Queued without waiting; clients too slow to keep up are dropped
+        if self.writer.is_closing():
+            return
+        if self.writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            self.writer.close()
+            return
+        self.writer.write(data)
+
+
+class Match:
+    # One game, stepped by the server and sent to its players tick by tick
+
+    def __init__(self, tiles: Tiles, players: List[RemotePlayer],
+                 tick_ms: int):
+        self.players = players
+        self.tick_ms = tick_ms
+        self.game = new_net_game(tiles, [p.name for p in players])
+        self.tick = 0
+        self.inputs = []  # since last tick
+        self.no_of_inputs = [0] * len(players)  # per slot, since last tick
+        self.watchers: List[RemotePlayer] = []
+        self.snapshot = None  # last sent to watchers
+
+        for i, p in enumerate(players):
+            p.match = self
+            p.slot = i
+            p.send(encode_start(self.game, i))
+
+    def add_input(self, slot: int, action: int, pressed: bool):
+        # Limited per tick, so that inputs always fit in a step record
+        if self.no_of_inputs[slot] < MAX_INPUTS_PER_TICK:
+            self.no_of_inputs[slot] += 1
+            self.inputs.append((get_net_key(slot, action), pressed))
+
+    def step(self):
+        inputs, self.inputs = self.inputs, []
+        self.no_of_inputs = [0] * len(self.players)
+        self.game.step(self.tick_ms, inputs)
+        self.tick += 1
+        data = encode_step(self.tick_ms, inputs)
+        # Digest now and then (spread over ticks by seed, as costly)
+        if (self.tick + self.game.seed) % DIGEST_EVERY_TICKS == 0 or \
+                self.game.game_over:
+            data += encode_digest(self.tick, self.game)
+        for p in self.players:
+            p.send(data)
+
+        # Watchers are sent what changed instead (only worked out if any)
+        self.watchers = [w for w in self.watchers
+                         if not w.writer.is_closing()]
+        if self.watchers:
+            snapshot = get_snapshot(self.game)
+            data = encode(MSG_DELTA, get_delta(self.snapshot, snapshot))
+            self.snapshot = snapshot
+            for w in self.watchers:
+                w.send(data)
+
+        if self.game.game_over:
+            self.close()
+
+    def add_watcher(self, watcher: RemotePlayer):
+        # Sent the game as it is now, which later changes are sent against
+        self.snapshot = get_snapshot(self.game)
+        watcher.send(encode(MSG_SNAPSHOT, encode_snapshot(self.snapshot)))
+        self.watchers.append(watcher)
+
+    def close(self):
+        for p in self.players + self.watchers:
+            p.writer.close()
+
+    @property
+    def abandoned(self) -> bool:
+        return all(p.writer.is_closing() for p in self.players)
+
+
+class Server:
+    # Runs every match at the same fixed tick rate on one asyncio loop:
+    # matches start once enough players have joined, key presses are queued
+    # for the next tick and each tick's inputs are sent to the players
+
+    def __init__(self, tiles: Tiles, players_per_match: int,
+                 tick_ms: int = SERVER_TICK_MS):
+        self.tiles = tiles
+        self.players_per_match = players_per_match
+        self.tick_ms = tick_ms
+        self.lobby: List[RemotePlayer] = []
+        self.matches: List[Match] = []
+        self.watchers: List[RemotePlayer] = []  # waiting for a match
+
+        # Since stats were last printed
+        self.ticks = 0
+        self.dropped_ticks = 0
+        self.busy_s = 0.0
+        self.max_tick_s = 0.0
+
+    async def serve(self, host: str = '', port: int = DEFAULT_PORT):
+        server = await asyncio.start_server(self.handle_player, host, port)
+        print('Listening on port {} ({} players per match, {} ms ticks)'
+              ''.format(port, self.players_per_match, self.tick_ms))
+        async with server:
+            await asyncio.gather(self.run_ticks(), self.print_stats())
+
+    async def handle_player(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter):
+        player = None
+        try:
+            msg_type, payload = await read_message(reader)
+            version = VERSION.unpack_from(payload)[0]
+            if version != PROTOCOL_VERSION:
+                return
+            elif msg_type == MSG_WATCH:
+                # Watch the latest match until it ends (anything sent by
+                # watchers ends it too)
+                player = RemotePlayer('', writer)
+                self.watch(player)
+                await reader.read(1)
+                return
+            elif msg_type != MSG_JOIN:
+                return
+            name = payload[VERSION.size:][:MAX_NAME_LENGTH]
+            player = RemotePlayer(name.decode(errors='replace'), writer)
+            self.join(player)
+
+            # Queue key presses for the player's snake until they leave
+            while not writer.is_closing():
+                msg_type, payload = await read_message(reader)
+                if msg_type != MSG_KEY:
+                    return
+                action, pressed = KEY.unpack(payload)
+                if player.match is not None and action < NO_OF_ACTIONS \
+                        and action != ACTION_PAUSE:
+                    player.match.add_input(player.slot, action, pressed)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError,
+                struct.error):
+            pass  # left or sent something invalid
+        finally:
+            if player in self.lobby:
+                self.lobby.remove(player)
+            if player in self.watchers:
+                self.watchers.remove(player)
+            writer.close()
+
+    def join(self, player: RemotePlayer):
+        self.lobby.append(player)
+        if len(self.lobby) >= self.players_per_match:
+            players = self.lobby[:self.players_per_match]
+            self.lobby = self.lobby[self.players_per_match:]
+            match = Match(self.tiles, players, self.tick_ms)
+            self.matches.append(match)
+            for watcher in self.watchers:
+                match.add_watcher(watcher)
+            self.watchers = []
+
+    def watch(self, watcher: RemotePlayer):
+        if self.matches:
+            self.matches[-1].add_watcher(watcher)
+        else:
+            self.watchers.append(watcher)
+
+    def step(self):
+        start = time.perf_counter()
+        failed = []
+        for match in self.matches:
+            try:
+                match.step()
+            except Exception as e:
+                # Only ends this match, not the ones stepped alongside it
+                print('Match ended by error: {!r}'.format(e))
+                failed.append(match)
+        for match in self.matches:
+            if match.abandoned or match in failed:
+                match.close()
+        self.matches = [m for m in self.matches if not m.game.game_over
+                        and not m.abandoned and m not in failed]
+
+        elapsed = time.perf_counter() - start
+        self.ticks += 1
+        self.busy_s += elapsed
+        self.max_tick_s = max(self.max_tick_s, elapsed)
+
+    async def run_ticks(self):
+        # Ticks are due at fixed times (rather than a fixed sleep after each)
+        # so that time spent stepping does not make the tick rate slip
+        loop = asyncio.get_running_loop()
+        tick_s = self.tick_ms / 1000
+        next_tick = loop.time()
+        while True:
+            next_tick += tick_s
+            behind = loop.time() - next_tick
+            if behind > MAX_TICKS_BEHIND * tick_s:
+                self.dropped_ticks += int(behind / tick_s)
+                next_tick = loop.time()
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            self.step()
+
+    async def print_stats(self):
+        while True:
+            await asyncio.sleep(STATS_EVERY_S)
+            if self.ticks == 0:
+                continue
+            print('{} matches, {} waiting, {:.1f} ticks/s, stepping {:.2f} '
+                  'ms avg / {:.2f} ms max, {} dropped'.format(
+                      len(self.matches), len(self.lobby),
+                      self.ticks / STATS_EVERY_S,
+                      self.busy_s / self.ticks * 1000,
+                      self.max_tick_s * 1000, self.dropped_ticks))
+            self.ticks = self.dropped_ticks = 0
+            self.busy_s = self.max_tick_s = 0.0
+
+
+async def read_message(reader: asyncio.StreamReader,
+                       max_size: int = MAX_MESSAGE_SIZE):
+    msg_type, size = MESSAGE.unpack(await reader.readexactly(MESSAGE.size))
+    if size > max_size:
+        raise ValueError('Message too big: {} bytes'.format(size))
+    return msg_type, await reader.readexactly(size)
@@ -1,20 +1,24 @@
-from typing import Optional, Iterator
+from collections import deque
+from itertools import islice
+from typing import Deque, Dict, Optional, Iterator
 
 from src.utils.config import Player
-from src.utils.util import Direction, Coords, CoordsList, Size2D, Util
+from src.utils.direction import Direction
+from src.utils.tiles import Coords, CoordsList, Tiles
 
 STARTING_LENGTH = 3  # Starting length
+MAX_QUEUED_TURNS = 3  # turns that can be pressed ahead of the moves
 RAND_NAME = "_rand_name_"
 
 
 class Snake:
 
-    def __init__(self, util: Util, player: Player, initial_moves_per_ms: float):
+    def __init__(self, util: Tiles, player: Player, initial_moves_per_ms: float):
         self.util = util
         self.player = player
 
-        self.direction = Direction.RIGHT
-        self.last_direction_moved = self.direction
+        self.last_direction_moved = Direction.RIGHT
+        self.turns: Deque[Direction] = deque()  # pending, one per move
         self.base_moves_per_ms = initial_moves_per_ms
         self.boost_moves_per_ms = 0
         self.ms_idle = 0.0
@@ -23,15 +27,17 @@ class Snake:
         self.ghost_ms = 0.0
         self.bullets = 0
 
-        self.coords = []
+        # Body (head first) and number of segments on each tile
+        self.coords: Deque[Coords] = deque()
+        self.counts: Dict[Coords, int] = {}
         for _ in range(STARTING_LENGTH):
-            self.coords += [(0, 0)]
+            self.add_tip((0, 0))
         self.max_length_reached = len(self.coords)
 
         self.alive = True
 
     def __contains__(self, item):
-        return item in self.coords
+        return item in self.counts
 
     def __len__(self) -> int:
         return len(self.coords)
@@ -46,13 +52,46 @@ class Snake:
         else:
             return None
 
+    @property
+    def tip(self) -> Optional[Coords]:
+        if len(self) > 0:
+            return self.coords[-1]
+        else:
+            return None
+
     @property
     def tail(self) -> CoordsList:
         if len(self) > 1:
-            return self.coords[1:]
+            return list(islice(self.coords, 1, None))
         else:
             return []
 
+    def is_in_tail(self, tile: Coords) -> bool:
+        # Head is the only segment on its tile unless the tail overlaps it
+        count = self.counts.get(tile, 0)
+        return count > 1 or (count == 1 and tile != self.coords[0])
+
+    def add_count(self, tile: Coords) -> None:
+        self.counts[tile] = self.counts.get(tile, 0) + 1
+
+    def remove_count(self, tile: Coords) -> None:
+        count = self.counts[tile] - 1
+        if count > 0:
+            self.counts[tile] = count
+        else:
+            del self.counts[tile]
+
+    def add_tip(self, tile: Coords) -> None:
+        self.coords.append(tile)
+        self.add_count(tile)
+
+    @property
+    def direction(self) -> Direction:
+        # Direction of the next move
+        if self.turns:
+            return self.turns[0]
+        return self.last_direction_moved
+
     @property
     def ms_per_move(self) -> float:
         return 1 / (self.base_moves_per_ms + self.boost_moves_per_ms)
@@ -66,18 +105,21 @@ class Snake:
         return self.bullets > 0
 
     def set_direction(self, new_dir: Direction) -> bool:
-        # e.g. If new direction is UP, cannot have just moved DOWN
+        # Queued after any pending turns, so that quick presses between
+        # moves are not lost; e.g. If new direction is UP, cannot be going
+        # DOWN by then
         illegal = [
             (Direction.UP, Direction.DOWN),
             (Direction.DOWN, Direction.UP),
             (Direction.LEFT, Direction.RIGHT),
             (Direction.RIGHT, Direction.LEFT),
         ]
-        if new_dir == self.last_direction_moved or \
-                (new_dir, self.last_direction_moved) in illegal:
+        last = self.turns[-1] if self.turns else self.last_direction_moved
+        if new_dir == last or (new_dir, last) in illegal or \
+                len(self.turns) >= MAX_QUEUED_TURNS:
             return False
         else:
-            self.direction = new_dir
+            self.turns.append(new_dir)
             return True
 
     def set_base_moves_per_ms(self, new_base_moves_per_ms: float) -> None:
@@ -87,10 +129,11 @@ class Snake:
         self.boost_moves_per_ms = new_boost_moves_per_ms
 
     def shrink(self, count: int) -> None:
-        self.coords = self.coords[:len(self.coords) - count]
+        for _ in range(min(count, len(self.coords))):
+            self.remove_count(self.coords.pop())
 
     def grow_by_one(self):
-        self.coords += [self.coords[-1]]
+        self.add_tip(self.coords[-1])
         if len(self.coords) > self.max_length_reached:
             self.max_length_reached = len(self.coords)
 
@@ -110,14 +153,17 @@ class Snake:
         # Consume idle time
         self.ms_idle -= self.ms_per_move
 
-        # New head
-        newHead = self.util.get_next_tile(self.head, self.direction)
+        # New head (taking the next pending turn, if any)
+        direction = self.turns.popleft() if self.turns else self.direction
+        newHead = self.util.get_next_tile(self.head, direction)
 
-        # Add new head and remove old tip
-        self.coords = [newHead] + self.coords[:-1]
+        # Remove old tip and add new head
+        self.remove_count(self.coords.pop())
+        self.coords.appendleft(newHead)
+        self.add_count(newHead)
 
         # Last direction moved
-        self.last_direction_moved = self.direction
+        self.last_direction_moved = direction
 
     def move_time(self, dt: float):
         # Update time
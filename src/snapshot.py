@@ -0,0 +1,322 @@
+import struct
+from array import array
+from collections import deque
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.game import Game, OBJ_NONE, OBJ_APPLE, OBJ_SHIELD, OBJ_GHOST, \
+    OBJ_BOMB, OBJ_BULLETS, OBJ_ENEMY, OBJ_POISON
+from src.replay import HEADER, COUNT, pack_players, unpack_players
+from src.utils.config import Config, Player
+from src.utils.direction import Direction
+from src.utils.tiles import Coords, Size2D, Tiles
+
+SNAPSHOT_MAGIC = b'PYSNAP\x00\x00'
+SNAPSHOT_VERSION = 1
+VERSION = struct.Struct('<H')  # first in deltas
+OP = struct.Struct('<B')  # how a section changed in a delta
+SECTION_SAME = 0
+SECTION_PATCH = 1  # changed values: COUNT, uint32 indices, values
+SECTION_FULL = 2  # all values: COUNT, values
+
+# Everything that can change during a game, as flat little-endian arrays
+# (name, dtype, values per row); tiles are uint16, so boards can be up to
+# 65536 tiles across
+SECTIONS = [
+    # Level, game over, paused and the tiles (-1 if none) of the apple and
+    # shield, ghost, bomb and bullets powerups
+    ('game', '<i4', 13),
+    ('minus', '<f8', 2),  # minus enemies, poisons (fractional after bombs)
+    # Per snake: alive, last direction moved, shield on, bullets, max.
+    # length reached, then body length and pending turns in the below
+    ('snakes', '<i4', 7),
+    # Per snake: ms idle, ghost ms, base and boost moves per ms
+    ('timers', '<f8', 4),
+    ('bodies', '<u2', 2),  # all snakes' segments, head first
+    ('turns', '<u1', 1),
+    ('enemies', '<u2', 2),
+    ('poisons', '<u2', 2),
+    ('bullets', '<i4', 8),  # origin, step, position, previous position
+    ('bullet_ms', '<f8', 1),  # since fired
+    ('free_tiles', '<u4', 1),  # in FreeTiles order (spawns depend on it)
+    ('rng', '<u4', 1),  # Mersenne Twister state words and position
+    ('gauss', '<f8', 1),  # spare random.gauss() value, if any
+]
+DTYPES = {name: np.dtype(dtype) for name, dtype, _ in SECTIONS}
+COLUMNS = {name: columns for name, _, columns in SECTIONS}
+
+# Bit patterns of each dtype, so that deltas compare values exactly
+BITS = {name: np.dtype('<u{}'.format(dtype.itemsize))
+        for name, dtype in DTYPES.items()}
+INDEX = np.dtype('<u4')
+
+
+class Snapshot:
+    # A game's state at one point: what it was started with (seed, size
+    # and players, which never change) and the arrays in SECTIONS
+
+    def __init__(self, seed: int, game_size_pixels: Size2D,
+                 game_size_tiles: Size2D, players: List[Player],
+                 sections: Dict[str, np.ndarray]):
+        self.seed = seed
+        self.game_size_pixels = game_size_pixels
+        self.game_size_tiles = game_size_tiles
+        self.players = players
+        self.sections = sections
+
+    def get(self, name: str) -> np.ndarray:
+        # Section with one row per item
+        return self.sections[name].reshape(-1, COLUMNS[name])
+
+
+def get_tile_or_none(tile: Optional[Coords]) -> List[int]:
+    return [-1, -1] if tile is None else list(tile)
+
+
+def get_snapshot(game: Game) -> Snapshot:
+    snakes = game.all_snakes
+    game_values = [game.level, game.game_over, game.paused]
+    for tile in [game.apple, game.pow_shield, game.pow_ghost,
+                 game.pow_bomb, game.pow_bullets]:
+        game_values += get_tile_or_none(tile)
+    bodies = [tile for s in snakes for tile in s]
+    turns = [d.value for s in snakes for d in s.turns]
+
+    bullets = game.fired_bullets
+    n = bullets.count
+    _, rng_words, gauss = game.rng.getstate()
+    free_tiles = game.free_tiles
+
+    values = {
+        'game': game_values,
+        'minus': [game.minus_enemies, game.minus_poisons],
+        'snakes': [[s.is_alive(), s.last_direction_moved.value,
+                    s.is_shield_on, s.bullets, s.max_length_reached,
+                    len(s), len(s.turns)] for s in snakes],
+        'timers': [[s.ms_idle, s.ghost_ms, s.base_moves_per_ms,
+                    s.boost_moves_per_ms] for s in snakes],
+        'bodies': bodies,
+        'turns': turns,
+        'enemies': game.enemies,
+        'poisons': game.poisons,
+        'bullets': np.hstack([bullets.origins[:n], bullets.steps[:n],
+                              bullets.coords[:n], bullets.prev_coords[:n]]),
+        'bullet_ms': bullets.times[:n],
+        'free_tiles': free_tiles.tiles[:free_tiles.count],
+        'rng': array('I', rng_words),  # (far faster to convert than ints)
+        'gauss': [] if gauss is None else [gauss],
+    }
+    # (copied, as some are views of the game's arrays)
+    sections = {name: np.array(values[name], dtype=DTYPES[name]).ravel()
+                for name, _, _ in SECTIONS}
+    return Snapshot(game.seed, (game.util.width_px, game.util.height_px),
+                    game.game_size_tiles,
+                    [s.player for s in snakes], sections)
+
+
+def encode_snapshot(snapshot: Snapshot) -> bytes:
+    data = bytearray(SNAPSHOT_MAGIC)
+    data += HEADER.pack(SNAPSHOT_VERSION, snapshot.seed,
+                        *snapshot.game_size_pixels,
+                        *snapshot.game_size_tiles)
+    data += pack_players(snapshot.players)
+    for name, _, _ in SECTIONS:
+        values = snapshot.sections[name]
+        data += COUNT.pack(len(values)) + values.tobytes()
+    return bytes(data)
+
+
+def decode_snapshot(data: bytes) -> Snapshot:
+    # Sections are read-only views of data (copied when changed by deltas)
+    if not data.startswith(SNAPSHOT_MAGIC):
+        raise Exception('Not a snapshot')
+    offset = len(SNAPSHOT_MAGIC)
+    version, seed, width_px, height_px, tiles_x, tiles_y = \
+        HEADER.unpack_from(data, offset)
+    if version != SNAPSHOT_VERSION:
+        raise Exception('Unsupported snapshot version: {}'.format(version))
+    players, offset = unpack_players(data, offset + HEADER.size)
+
+    sections = {}
+    for name, _, _ in SECTIONS:
+        count = COUNT.unpack_from(data, offset)[0]
+        offset += COUNT.size
+        sections[name] = np.frombuffer(data, DTYPES[name], count, offset)
+        offset += count * DTYPES[name].itemsize
+    return Snapshot(seed, (width_px, height_px), (tiles_x, tiles_y),
+                    players, sections)
+
+
+def get_delta(old: Snapshot, new: Snapshot) -> bytes:
+    # Changes from one snapshot to a later one of the same game: per
+    # section, nothing, the values that changed or (if that would be
+    # bigger, or the length changed) all values
+    data = bytearray(VERSION.pack(SNAPSHOT_VERSION))
+    for name, _, _ in SECTIONS:
+        before = old.sections[name]
+        after = new.sections[name]
+        if before.tobytes() == after.tobytes():
+            data += OP.pack(SECTION_SAME)  # (most are, and bytes are quick)
+            continue
+        if len(before) == len(after):
+            changed = np.flatnonzero(
+                before.view(BITS[name]) != after.view(BITS[name]))
+            itemsize = DTYPES[name].itemsize
+            if len(changed) * (INDEX.itemsize + itemsize) < \
+                    len(after) * itemsize:
+                data += OP.pack(SECTION_PATCH) + COUNT.pack(len(changed))
+                data += changed.astype(INDEX).tobytes()
+                data += after[changed].tobytes()
+                continue
+        data += OP.pack(SECTION_FULL) + COUNT.pack(len(after))
+        data += after.tobytes()
+    return bytes(data)
+
+
+def apply_delta(old: Snapshot, delta: bytes) -> Snapshot:
+    version = VERSION.unpack_from(delta)[0]
+    if version != SNAPSHOT_VERSION:
+        raise Exception('Unsupported delta version: {}'.format(version))
+    offset = VERSION.size
+
+    sections = {}
+    for name, _, _ in SECTIONS:
+        op = OP.unpack_from(delta, offset)[0]
+        offset += OP.size
+        if op == SECTION_SAME:
+            sections[name] = old.sections[name]
+            continue
+        count = COUNT.unpack_from(delta, offset)[0]
+        offset += COUNT.size
+        if op == SECTION_PATCH:
+            indices = np.frombuffer(delta, INDEX, count, offset)
+            offset += count * INDEX.itemsize
+            values = old.sections[name].copy()
+            values[indices] = np.frombuffer(delta, DTYPES[name], count,
+                                            offset)
+        elif op == SECTION_FULL:
+            values = np.frombuffer(delta, DTYPES[name], count, offset)
+        else:
+            raise Exception('Invalid delta')
+        offset += count * DTYPES[name].itemsize
+        sections[name] = values
+    return Snapshot(old.seed, old.game_size_pixels, old.game_size_tiles,
+                    old.players, sections)
+
+
+def get_tile(values: List[int]) -> Optional[Coords]:
+    return None if values[0] < 0 else (values[0], values[1])
+
+
+def restore(game: Game, snapshot: Snapshot):
+    # Put a game (of the same size and players) in the snapshot's state
+    if snapshot.game_size_tiles != tuple(game.game_size_tiles) or \
+            snapshot.game_size_pixels != (game.util.width_px,
+                                          game.util.height_px) or \
+            len(snapshot.players) != len(game.all_snakes):
+        raise Exception('Snapshot is of a game of another size or with '
+                        'other players')
+    game.seed = snapshot.seed
+    game_values = snapshot.sections['game'].tolist()
+    game.level = game_values[0]
+    game.game_over = bool(game_values[1])
+    game.paused = bool(game_values[2])
+    game.apple, game.pow_shield, game.pow_ghost, game.pow_bomb, \
+        game.pow_bullets = [get_tile(game_values[i:i + 2])
+                            for i in range(3, 13, 2)]
+    game.minus_enemies, game.minus_poisons = \
+        snapshot.sections['minus'].tolist()
+    game.enemies = [tuple(t) for t in snapshot.get('enemies').tolist()]
+    game.poisons = [tuple(t) for t in snapshot.get('poisons').tolist()]
+    game.events = []
+
+    # Snakes
+    bodies = [tuple(t) for t in snapshot.get('bodies').tolist()]
+    turns = snapshot.sections['turns'].tolist()
+    body_start = turns_start = 0
+    for snake, values, timers in zip(game.all_snakes,
+                                     snapshot.get('snakes').tolist(),
+                                     snapshot.get('timers').tolist()):
+        alive, direction, shield, bullets, max_length, length, \
+            no_of_turns = values
+        snake.alive = bool(alive)
+        snake.last_direction_moved = Direction(direction)
+        snake.is_shield_on = bool(shield)
+        snake.bullets = bullets
+        snake.max_length_reached = max_length
+        snake.ms_idle, ghost_ms, snake.base_moves_per_ms, \
+            snake.boost_moves_per_ms = timers
+        snake.ghost_ms = ghost_ms or 0  # an int once it has run out
+
+        snake.coords = deque(bodies[body_start:body_start + length])
+        body_start += length
+        snake.counts = {}
+        for tile in snake.coords:
+            snake.add_count(tile)
+        snake.turns = deque(Direction(d) for d in
+                            turns[turns_start:turns_start + no_of_turns])
+        turns_start += no_of_turns
+    game.live_snakes = [s for s in game.all_snakes if s.is_alive()]
+
+    # Grids (live snakes' segments and objects occupy tiles)
+    game.objects[:] = OBJ_NONE
+    for obj, tiles in [(OBJ_APPLE, [game.apple]),
+                       (OBJ_SHIELD, [game.pow_shield]),
+                       (OBJ_GHOST, [game.pow_ghost]),
+                       (OBJ_BOMB, [game.pow_bomb]),
+                       (OBJ_BULLETS, [game.pow_bullets]),
+                       (OBJ_ENEMY, game.enemies),
+                       (OBJ_POISON, game.poisons)]:
+        for tile in tiles:
+            if tile is not None:
+                game.objects[tile] = obj
+    game.segments[:] = 0
+    for snake in game.live_snakes:
+        for tile, count in snake.counts.items():
+            game.segments[tile] += count
+    game.occupancy[:] = game.segments + (game.objects != OBJ_NONE)
+
+    free_tiles = game.free_tiles
+    free = snapshot.sections['free_tiles']
+    free_tiles.count = len(free)
+    free_tiles.tiles[:len(free)] = free
+    free_tiles.position[free] = np.arange(len(free))
+
+    # Bullets
+    bullets = game.fired_bullets
+    rows = snapshot.get('bullets')
+    while len(bullets.times) < len(rows):
+        bullets.grow()
+    n = bullets.count = len(rows)
+    bullets.origins[:n] = rows[:, 0:2]
+    bullets.steps[:n] = rows[:, 2:4]
+    bullets.coords[:n] = rows[:, 4:6]
+    bullets.prev_coords[:n] = rows[:, 6:8]
+    bullets.times[:n] = snapshot.sections['bullet_ms']
+
+    # (version 3 is the only state format of random.Random)
+    gauss = snapshot.sections['gauss'].tolist()
+    game.rng.setstate((3, tuple(snapshot.sections['rng'].tolist()),
+                       gauss[0] if gauss else None))
+
+
+def new_game(snapshot: Snapshot) -> Game:
+    # Only the players are needed from the config (as for replays)
+    cfg = Config('')
+    cfg.players = snapshot.players
+    cfg.all_keys = set().union(*[p.all_keys for p in snapshot.players])
+    tiles = Tiles(snapshot.game_size_pixels, snapshot.game_size_tiles)
+    game = Game(tiles, cfg, snapshot.game_size_tiles, snapshot.seed)
+    restore(game, snapshot)
+    return game
+
+
+def save(game: Game, snapshot_file: str):
+    with open(snapshot_file, 'wb') as f:
+        f.write(encode_snapshot(get_snapshot(game)))
+
+
+def load(snapshot_file: str) -> Snapshot:
+    with open(snapshot_file, 'rb') as f:
+        return decode_snapshot(f.read())
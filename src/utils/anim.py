@@ -18,6 +18,12 @@ class SpriteSheetAnimation:
             self.sprites.append(
                 sprite_sheet.subsurface(pg.Rect(i * sps, 0, sps, sps)))
 
+        # Area of each sprite in the topmost surface the sheet is part of
+        # (e.g. an atlas), for blitting straight from that
+        x, y = sprite_sheet.get_abs_offset()
+        self.rects = [pg.Rect(x + i * sps, y, sps, sps)
+                      for i in range(self.no_of_sprites)]
+
         fpms = frames_per_second / 1000  # frames per ms
         self.mspf = 1 / fpms  # ms per frame
 
@@ -36,3 +42,6 @@ class SpriteSheetAnimation:
 
     def get_sprite(self):
         return self.sprites[self.sprite_index]
+
+    def get_rect(self) -> pg.Rect:
+        return self.rects[self.sprite_index]
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+from typing import Dict, Tuple
+
+import pygame as pg
+from pygame import Rect
+from pygame.surface import Surface
+
+from src.utils.direction import Direction
+from src.utils.util import SCALE_VERSION, rotate_image, write_cache_file, \
+    Util
+
+ATLAS_MAX_WIDTH = 1024  # pixels; sprites past this go on another row
+
+# Sprites drawn on tiles (name: image folder), packed into one atlas
+TILE_SPRITES = {
+    'apple': 'apple/',
+    'enemy': 'skulls/enemy/',
+    'poison': 'skulls/poison/',
+    'shield': 'powerups/shield/',
+    'ghost': 'powerups/ghost/',
+    'bomb': 'powerups/bomb/',
+    'bullets': 'powerups/bullets/',
+    'powerups_marker': 'powerups/marker/',  # animation sheet
+    'snake_normal': 'snake/snake/',
+    'snake_eyes': 'snake/eyes/',  # packed in all four rotations instead
+    'snake_ghost': 'snake/ghost/',
+    'snake_shielded': 'snake/shielded/',
+}
+
+Atlas = Tuple[Surface, Dict[str, Rect]]
+
+
+def get_eyes_name(direction: Direction) -> str:
+    return 'snake_eyes_' + direction.name.lower()
+
+
+def pack(sprites: Dict[str, Surface]) -> Atlas:
+    # Rows of sprites, tallest first, and the area of each in the atlas
+    rects = {}
+    x = y = row_height = 0
+    for name, sprite in sorted(sprites.items(),
+                               key=lambda item: -item[1].get_height()):
+        width, height = sprite.get_size()
+        if x > 0 and x + width > ATLAS_MAX_WIDTH:
+            x, y, row_height = 0, y + row_height, 0
+        rects[name] = Rect(x, y, width, height)
+        x += width
+        row_height = max(row_height, height)
+
+    atlas = Surface((max(r.right for r in rects.values()),
+                     max(r.bottom for r in rects.values())), pg.SRCALPHA, 32)
+    for name, sprite in sprites.items():
+        # Copied as is (max with the transparent atlas) rather than blended
+        atlas.blit(sprite, rects[name], special_flags=pg.BLEND_RGBA_MAX)
+    return atlas, rects
+
+
+def load_sprites(util: Util) -> Dict[str, Surface]:
+    sprites = {name: util.load_img_from_folder(folder)
+               for name, folder in TILE_SPRITES.items()}
+    eyes = sprites.pop('snake_eyes')
+    for d in Direction:
+        sprites[get_eyes_name(d)] = rotate_image(eyes, d)
+    return sprites
+
+
+def load_atlas(util: Util) -> Atlas:
+    # Packed atlases are saved to the cache folder (if there is one) under
+    # the width, the scaling version and a hash of all the images they were
+    # made from, so that later launches load a single image
+    if util.img_cache_folder is None:
+        return pack(load_sprites(util))
+
+    digest = hashlib.sha1()
+    for folder in TILE_SPRITES.values():
+        with open(util.get_img_source_path(folder), 'rb') as f:
+            digest.update(f.read())
+    cache_path = '{}atlas/{}-v{}-{}'.format(util.img_cache_folder,
+                                            util.view_width_px, SCALE_VERSION,
+                                            digest.hexdigest()[:16])
+    if os.path.exists(cache_path + '.json') and \
+            os.path.exists(cache_path + '.png'):
+        with open(cache_path + '.json') as f:
+            rects = {name: Rect(r) for name, r in json.load(f).items()}
+        return pg.image.load(cache_path + '.png'), rects
+
+    atlas, rects = pack(load_sprites(util))
+
+    def write_index(path: str):
+        with open(path, 'w') as f:
+            json.dump({name: list(r) for name, r in rects.items()}, f)
+
+    # Index last, as the atlas is only loaded from the cache if it exists
+    write_cache_file(cache_path + '.png',
+                     lambda path: pg.image.save(atlas, path))
+    write_cache_file(cache_path + '.json', write_index)
+    return atlas, rects
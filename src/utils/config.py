@@ -1,7 +1,9 @@
 from configparser import ConfigParser
 from typing import Set
 
-VALID_WINDOW_SIZES = [1080, 900, 750, 600, 300]
+# Window sizes with hand-made images (others are rescaled from the largest)
+NATIVE_WINDOW_SIZES = [1080, 900, 750, 600, 300]
+MIN_WINDOW_SIZE = 150
 Keys = Set[int]
 
 
@@ -49,10 +51,20 @@ class Config:
             int(video['window_size'])
         self.font = video['font']
         self.draw_fps = video['draw_fps'].lower() in ['true', 'yes']
-
-        if self.window_size not in VALID_WINDOW_SIZES:
-            raise Exception('Invalid window size; Valid sizes: {}'
-                            ''.format(VALID_WINDOW_SIZES))
+        self.dirty_rects = \
+            video.get('dirty_rects', 'False').lower() in ['true', 'yes']
+        self.tick_ms = int(video.get('tick_ms', '0'))
+        self.interpolate_bullets = video.get(
+            'interpolate_bullets', 'False').lower() in ['true', 'yes']
+        self.frame_timings = \
+            video.get('frame_timings', 'False').lower() in ['true', 'yes']
+
+        if self.window_size < MIN_WINDOW_SIZE:
+            raise Exception('Invalid window size; must be at least {}'
+                            ''.format(MIN_WINDOW_SIZE))
+        if self.tick_ms < 0:
+            raise Exception('Invalid tick_ms; must be 0 (one tick per frame)'
+                            ' or a positive number of milliseconds')
 
         # Players
         self.players = []
@@ -94,10 +106,15 @@ class Config:
         self.cp[section]['window_size'] = str(self.window_size)
         self.cp[section]['font'] = self.font
         self.cp[section]['draw_fps'] = str(self.draw_fps)
-
-        if self.window_size not in VALID_WINDOW_SIZES:
-            raise Exception('Invalid window size; Valid sizes: {}'
-                            ''.format(VALID_WINDOW_SIZES))
+        self.cp[section]['dirty_rects'] = str(self.dirty_rects)
+        self.cp[section]['tick_ms'] = str(self.tick_ms)
+        self.cp[section]['interpolate_bullets'] = \
+            str(self.interpolate_bullets)
+        self.cp[section]['frame_timings'] = str(self.frame_timings)
+
+        if self.window_size < MIN_WINDOW_SIZE:
+            raise Exception('Invalid window size; must be at least {}'
+                            ''.format(MIN_WINDOW_SIZE))
 
         # Players
         for i, p in enumerate(self.players):
@@ -0,0 +1,41 @@
+from random import Random
+from typing import Optional
+
+import numpy as np
+
+from src.utils.tiles import Coords, Size2D
+
+
+class FreeTiles:
+    # Free tiles (flattened) in a swap-remove array along with each tile's
+    # position in it, so that taking, freeing and picking a random free tile
+    # take constant time no matter how full the board is
+
+    def __init__(self, game_size_tiles: Size2D):
+        self.tiles_y = game_size_tiles[1]
+        no_of_tiles = game_size_tiles[0] * game_size_tiles[1]
+        self.tiles = np.arange(no_of_tiles)
+        self.position = np.arange(no_of_tiles)
+        self.count = no_of_tiles
+
+    def __len__(self) -> int:
+        return self.count
+
+    def take(self, tile: Coords) -> None:
+        flat = tile[0] * self.tiles_y + tile[1]
+        i = self.position[flat]
+        last = self.tiles[self.count - 1]
+        self.tiles[i] = last
+        self.position[last] = i
+        self.count -= 1
+
+    def free(self, tile: Coords) -> None:
+        flat = tile[0] * self.tiles_y + tile[1]
+        self.tiles[self.count] = flat
+        self.position[flat] = self.count
+        self.count += 1
+
+    def pick(self, rng: Random) -> Optional[Coords]:
+        if self.count == 0:
+            return None
+        return divmod(int(self.tiles[rng.randrange(self.count)]), self.tiles_y)
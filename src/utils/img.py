@@ -1,34 +1,49 @@
-from src.utils.util import Util
+from concurrent.futures import Executor
+from typing import Optional
+
+from pygame.surface import Surface
+
+from src.utils.atlas import get_eyes_name, load_atlas
+from src.utils.direction import Direction
+from src.utils.util import submit, Util
 
 
 class ImgHolder:
-    def __init__(self, util: Util):
-        # Game window
+    def __init__(self, util: Util, pool: Optional[Executor] = None):
+        # Images are decoded on the pool (if given) and held as futures
+        # until post_init, which waits for them
+
+        # Game window (needed before the video mode is set)
         self.game_icon = util.load_img('icon.png')
 
         # Whole-screen
-        self.game_over = util.load_img_from_folder('game_over/')
-        self.background = util.load_img_from_folder('background/')
-
-        # Apple and skulls
-        self.apple = util.load_img_from_folder('apple/')
-        self.enemy = util.load_img_from_folder('skulls/enemy/')
-        self.poison = util.load_img_from_folder('skulls/poison/')
-
-        # Powerups
-        self.shield = util.load_img_from_folder('powerups/shield/')
-        self.ghost = util.load_img_from_folder('powerups/ghost/')
-        self.bomb = util.load_img_from_folder('powerups/bomb/')
-        self.bullets = util.load_img_from_folder('powerups/bullets/')
+        self.background = submit(pool, util.load_img_from_folder,
+                                 'background/')
 
-        # Snake
-        self.snake_normal = util.load_img_from_folder('snake/snake/')
-        self.snake_eyes = util.load_img_from_folder('snake/eyes/')
-        self.snake_ghost = util.load_img_from_folder('snake/ghost/')
-        self.snake_shielded = util.load_img_from_folder('snake/shielded/')
+        # Tile sprites (apple, skulls, powerups and snake) packed into one
+        # atlas; post_init sets the area of each in it
+        self.atlas = submit(pool, load_atlas, util)
+        self.sprites = {}
+        self.snake_eyes_by_direction = {}
 
-        # Animation sheets
-        self.powerups_marker = util.load_img_from_folder('powerups/marker/')
+        # Only needed at game over, so not waited for until first used
+        self.game_over_loading = submit(pool, util.load_img_from_folder,
+                                        'game_over/')
+        self.game_over_img = None
 
     def post_init(self):
-        self.game_over = self.game_over.convert()
+        # Convert to the display's pixel format for faster blits (opaque
+        # whole-screen images, per-pixel alpha for sprites)
+        self.background = self.background.result().convert()
+
+        self.atlas, self.sprites = self.atlas.result()
+        self.atlas = self.atlas.convert_alpha()
+        # Eyes were packed rotated, so none are rotated when drawn
+        self.snake_eyes_by_direction = {
+            d: self.sprites[get_eyes_name(d)] for d in Direction}
+
+    @property
+    def game_over(self) -> Surface:
+        if self.game_over_img is None:
+            self.game_over_img = self.game_over_loading.result().convert()
+        return self.game_over_img
@@ -1,8 +1,22 @@
+import dbm
 import shelve
+import sqlite3
+from contextlib import closing, contextmanager
 from datetime import datetime
 
-KEY = 'score'
+KEY = 'score'  # of the list in old shelve highscores files
 MAX_SCORES = 10
+DB_SUFFIX = '.sqlite3'
+DB_TIMEOUT_S = 10  # waited for another game to finish writing
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS scores (id INTEGER PRIMARY KEY, '
+    'name TEXT, max_length INTEGER, level_reached INTEGER, '
+    'score INTEGER, at TEXT)',
+    # Top scores (earliest first on ties) are read straight off this index
+    'CREATE INDEX IF NOT EXISTS scores_by_score ON scores (score DESC, id)',
+    'CREATE TABLE IF NOT EXISTS migrated (file TEXT PRIMARY KEY)',
+]
 
 
 class Score:
@@ -25,20 +39,62 @@ class Score:
 
 
 class ScoresList:
+    # Highscores in an SQLite database (highscores_file + DB_SUFFIX) that
+    # saved scores are only ever added to, so saving one does not rewrite
+    # the others and games saving at the same time do not lose scores. An
+    # old shelve highscores file of the same name is imported once.
+
     def __init__(self, highscores_file: str):
         self.highscores_file = highscores_file
-        self.scores_list = []
+        self.db_file = highscores_file + DB_SUFFIX
+        self.scores_list = []  # top MAX_SCORES
+        self.unsaved = []  # added since last write
+
+    def connect(self) -> sqlite3.Connection:
+        # Transactions are begun explicitly (see transaction())
+        conn = sqlite3.connect(self.db_file, timeout=DB_TIMEOUT_S,
+                               isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        for statement in SCHEMA:
+            conn.execute(statement)
+        self.migrate(conn)
+        return conn
+
+    def migrate(self, conn: sqlite3.Connection):
+        # Import scores from a shelve file (best first, so ties keep order)
+        if not dbm.whichdb(self.highscores_file):
+            return
+        with transaction(conn):
+            if conn.execute('SELECT 1 FROM migrated WHERE file = ?',
+                            (self.highscores_file,)).fetchone():
+                return
+            with shelve.open(self.highscores_file, 'r') as f:
+                for score in f.get(KEY, []):
+                    insert(conn, score)
+            conn.execute('INSERT INTO migrated VALUES (?)',
+                         (self.highscores_file,))
 
     def read(self):
-        with shelve.open(self.highscores_file) as f:
-            if KEY in f:
-                self.scores_list = f[KEY]
+        with closing(self.connect()) as conn:
+            rows = conn.execute(
+                'SELECT name, max_length, level_reached, at FROM scores '
+                'ORDER BY score DESC, id LIMIT ?', (MAX_SCORES,)).fetchall()
+        self.scores_list = [
+            Score(name, max_length, level_reached, datetime.fromisoformat(at))
+            for name, max_length, level_reached, at in rows]
 
     def write(self):
-        with shelve.open(self.highscores_file) as f:
-            f[KEY] = self.scores_list
+        # Save scores added since last write, then pick up any that other
+        # games have saved
+        with closing(self.connect()) as conn:
+            with transaction(conn):
+                for score in self.unsaved:
+                    insert(conn, score)
+        self.unsaved = []
+        self.read()
 
     def add_score(self, new_score: Score):
+        self.unsaved.append(new_score)
         new_score_index = len(self.scores_list)  # assume lowest score
         for i, s in enumerate(self.scores_list):
             if new_score.score > s.score:
@@ -48,3 +104,23 @@ class ScoresList:
         if new_score_index < MAX_SCORES:
             self.scores_list.insert(new_score_index, new_score)
             self.scores_list = self.scores_list[:MAX_SCORES]
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection):
+    # Takes the write lock up front, so that concurrent writers wait for
+    # each other (up to DB_TIMEOUT_S) rather than fail part way through
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
+def insert(conn: sqlite3.Connection, score: Score):
+    conn.execute('INSERT INTO scores (name, max_length, level_reached, '
+                 'score, at) VALUES (?, ?, ?, ?, ?)',
+                 (score.name, score.max_length, score.level_reached,
+                  score.score, score.at.isoformat()))
@@ -1,14 +1,58 @@
-from src.utils.util import Util
+from concurrent.futures import Executor
+from typing import Iterable, Optional
+
+from pygame.mixer import Sound
+
+from src.events import Event
+from src.utils.util import submit, Util
 
 
 class SfxHolder:
-    def __init__(self, util: Util) -> None:
-        self.apple = util.load_sfx('apple.wav')
-        self.poison = util.load_sfx('poison.wav')
-        self.powerup = util.load_sfx('powerup.wav')
-        self.shield_off = util.load_sfx('shield_off.wav')
-        self.bullet_fire = util.load_sfx('bullet_fire.wav')
-        self.bullet_hit_skull = util.load_sfx('bullet_hit_skull.wav')
-        self.bullet_hit_snake = util.load_sfx('bullet_hit_snake.wav')
-        self.game_over = util.load_sfx('game_over.wav')
-        self.snake_death = util.load_sfx('snake_death.wav')
+    def __init__(self, util: Util, pool: Optional[Executor] = None) -> None:
+        # Sounds are loaded on the pool (if given) and held as futures
+        # until post_init, which waits for them
+        self.apple = submit(pool, util.load_sfx, 'apple.wav')
+        self.poison = submit(pool, util.load_sfx, 'poison.wav')
+        self.powerup = submit(pool, util.load_sfx, 'powerup.wav')
+        self.shield_off = submit(pool, util.load_sfx, 'shield_off.wav')
+        self.bullet_fire = submit(pool, util.load_sfx, 'bullet_fire.wav')
+        self.bullet_hit_skull = submit(pool, util.load_sfx,
+                                       'bullet_hit_skull.wav')
+        self.bullet_hit_snake = submit(pool, util.load_sfx,
+                                       'bullet_hit_snake.wav')
+        self.snake_death = submit(pool, util.load_sfx, 'snake_death.wav')
+
+        # Sound effect per game event (set in post_init)
+        self.by_event = {}
+
+        # Only needed at game over, so not waited for until first used
+        self.game_over_loading = submit(pool, util.load_sfx, 'game_over.wav')
+
+    def post_init(self) -> None:
+        self.apple = self.apple.result()
+        self.poison = self.poison.result()
+        self.powerup = self.powerup.result()
+        self.shield_off = self.shield_off.result()
+        self.bullet_fire = self.bullet_fire.result()
+        self.bullet_hit_skull = self.bullet_hit_skull.result()
+        self.bullet_hit_snake = self.bullet_hit_snake.result()
+        self.snake_death = self.snake_death.result()
+
+        self.by_event = {
+            Event.APPLE: self.apple,
+            Event.POISON: self.poison,
+            Event.POWERUP: self.powerup,
+            Event.SHIELD_OFF: self.shield_off,
+            Event.BULLET_FIRE: self.bullet_fire,
+            Event.BULLET_HIT_SKULL: self.bullet_hit_skull,
+            Event.BULLET_HIT_SNAKE: self.bullet_hit_snake,
+            Event.SNAKE_DEATH: self.snake_death,
+        }
+
+    @property
+    def game_over(self) -> Sound:
+        return self.game_over_loading.result()
+
+    def play_events(self, events: Iterable[Event]) -> None:
+        for event in events:
+            self.by_event[event].play()
@@ -1,14 +1,23 @@
+import re
+from collections import OrderedDict
+
+from pygame.font import Font
+
 from src.utils.colours import *
 from src.utils.config import Config
 from src.utils.util import Util
 
+TEXT_CACHE_SIZE = 128  # max. rendered texts kept per font
+NUMBER_SUFFIX = re.compile(r'^(.*?)([0-9.]+)$')  # e.g. ('Ghost: ', '9.5')
+
 
 class Text:
     def __init__(self, cfg: Config, util: Util):
         # Centered 'PAUSED'' text
         paused_font = pg.font.SysFont(cfg.font, int(cfg.width_px / 20))
         self.paused = paused_font.render('PAUSED', True, WHITE)
-        self.paused_rect = self.paused.get_rect(center=util.center_px)
+        self.paused_rect = self.paused.get_rect(
+            center=(int(cfg.width_px / 2), int(cfg.height_px / 2)))
 
         y_offset = cfg.height_px
 
@@ -33,3 +42,42 @@ class Text:
         self.restart_rect.top = y_offset - self.restart_rect.height
         self.restart_rect.left = cfg.width_px - self.restart_rect.width
         y_offset -= self.restart_rect.height
+
+
+class TextCache:
+    # Rendered texts keyed by (text, colour) with least recently used ones
+    # evicted first. Texts ending in a number (e.g. the ghost countdown) are
+    # composed from the cached label and cached digit glyphs rather than
+    # rendered from scratch each time the number changes.
+
+    def __init__(self, font: Font, max_size: int = TEXT_CACHE_SIZE):
+        self.font = font
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+
+    def render(self, text: str, colour: pg.Color) -> pg.Surface:
+        key = (text, tuple(colour))
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+
+        match = NUMBER_SUFFIX.match(text)
+        if match and len(text) > 1:
+            label, number = match.groups()
+            parts = [self.render(part, colour)
+                     for part in [label] + list(number) if part]
+            surface = pg.Surface(
+                (sum(p.get_width() for p in parts), self.font.get_height()),
+                pg.SRCALPHA)
+            x = 0
+            for part in parts:
+                surface.blit(part, (x, 0))
+                x += part.get_width()
+        else:
+            surface = self.font.render(text, True, colour)
+
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
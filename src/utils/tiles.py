@@ -0,0 +1,122 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from src.utils.direction import Direction
+
+Size2D = Tuple[int, int]
+Coords = Tuple[int, int]
+CoordsList = List[Coords]
+
+
+def get_next_xy(coords: Coords, direction: Direction, px: int = 1) -> Coords:
+    x = coords[0]
+    y = coords[1]
+
+    if direction == Direction.UP:
+        return x, y - px
+    elif direction == Direction.DOWN:
+        return x, y + px
+    elif direction == Direction.LEFT:
+        return x - px, y
+    elif direction == Direction.RIGHT:
+        return x + px, y
+    else:
+        raise NotImplementedError
+
+
+class Tiles:
+    # Tile and pixel arithmetic only; safe to use without pygame (headless)
+
+    def __init__(self, game_size_pixels: Size2D, game_size_tiles: Size2D):
+        self.width_px = game_size_pixels[0]
+        self.height_px = game_size_pixels[1]
+        self.center_px = int(self.width_px / 2), int(self.height_px / 2)
+
+        self.tiles_x = game_size_tiles[0]
+        self.tiles_y = game_size_tiles[1]
+
+        self.tile_width_px = self.width_px / self.tiles_x
+        self.tile_height_px = self.height_px / self.tiles_y
+
+        # Lookup tables are per axis (a tile's x and y are looked up
+        # separately) so that they stay small for big boards
+        xs = np.arange(self.tiles_x)
+        ys = np.arange(self.tiles_y)
+
+        # Tile -> pixel origin and center
+        self.tile_x_px = (xs * self.tile_width_px).astype(int).tolist()
+        self.tile_y_px = (ys * self.tile_height_px).astype(int).tolist()
+        self.tile_x_center_px = ((xs * self.tile_width_px) +
+                                 (self.tile_width_px / 2)).astype(int).tolist()
+        self.tile_y_center_px = ((ys * self.tile_height_px) +
+                                 (self.tile_height_px / 2)).astype(int).tolist()
+
+        # Pixel (on screen) -> tile whose origin is the last one at or
+        # before it (so that they agree when tiles are not whole pixels)
+        self.px_tile_x = (np.searchsorted(
+            self.tile_x_px + [self.width_px], np.arange(self.width_px + 1),
+            side='right') - 1).tolist()
+        self.px_tile_y = (np.searchsorted(
+            self.tile_y_px + [self.height_px], np.arange(self.height_px + 1),
+            side='right') - 1).tolist()
+
+        # Next tile's (x, y) per direction
+        same_x, same_y = xs.tolist(), ys.tolist()
+        prev_x = ((xs - 1) % self.tiles_x).tolist()
+        next_x = ((xs + 1) % self.tiles_x).tolist()
+        prev_y = ((ys - 1) % self.tiles_y).tolist()
+        next_y = ((ys + 1) % self.tiles_y).tolist()
+        self.next_tile_tables = {
+            Direction.UP: (same_x, prev_y),
+            Direction.DOWN: (same_x, next_y),
+            Direction.LEFT: (prev_x, same_y),
+            Direction.RIGHT: (next_x, same_y),
+        }
+
+        # Each axis twice (forwards and backwards) for wrapping rays of tiles
+        self.ring_x = np.tile(xs, 2).tolist()
+        self.ring_y = np.tile(ys, 2).tolist()
+        self.ring_x_reversed = self.ring_x[::-1]
+        self.ring_y_reversed = self.ring_y[::-1]
+
+    def get_xy(self, tile: Coords) -> Coords:
+        return self.tile_x_px[tile[0]], self.tile_y_px[tile[1]]
+
+    def get_xy_center(self, tile: Coords) -> Coords:
+        return self.tile_x_center_px[tile[0]], self.tile_y_center_px[tile[1]]
+
+    def is_xy_out_of_screen(self, xy: Coords) -> bool:
+        return xy[0] < 0 or xy[0] > self.width_px or \
+               xy[1] < 0 or xy[1] > self.height_px
+
+    def get_xy_tile(self, xy: Coords) -> Coords:
+        if self.is_xy_out_of_screen(xy):
+            return int(xy[0] / self.tile_width_px), \
+                   int(xy[1] / self.tile_height_px)
+        return self.px_tile_x[xy[0]], self.px_tile_y[xy[1]]
+
+    def get_next_tile(self, coords: Coords, direction: Direction) -> Coords:
+        x_table, y_table = self.next_tile_tables[direction]
+        return x_table[coords[0]], y_table[coords[1]]
+
+    def get_tiles_ahead(self, coords: Coords, direction: Direction,
+                        count: int) -> CoordsList:
+        # Tiles reached by moving up to count times, each listed once
+        x, y = coords
+        if direction == Direction.UP:
+            start = self.tiles_y - y
+            ray = self.ring_y_reversed[start:start + min(count, self.tiles_y)]
+            return [(x, ray_y) for ray_y in ray]
+        elif direction == Direction.DOWN:
+            ray = self.ring_y[y + 1:y + 1 + min(count, self.tiles_y)]
+            return [(x, ray_y) for ray_y in ray]
+        elif direction == Direction.LEFT:
+            start = self.tiles_x - x
+            ray = self.ring_x_reversed[start:start + min(count, self.tiles_x)]
+            return [(ray_x, y) for ray_x in ray]
+        elif direction == Direction.RIGHT:
+            ray = self.ring_x[x + 1:x + 1 + min(count, self.tiles_x)]
+            return [(ray_x, y) for ray_x in ray]
+        else:
+            raise NotImplementedError
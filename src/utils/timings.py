@@ -0,0 +1,71 @@
+import json
+from time import perf_counter
+from typing import Dict, List
+
+import numpy as np
+
+FRAME_TIMINGS_SIZE = 1000  # most recent frames kept
+PERCENTILES = [50, 95, 99]
+
+# What each frame's time is spent on, in the order done (drawing is split as
+# in Drawer: board/changes, sprites, bullets and HUD)
+PHASES = ['events', 'step', 'draw_board', 'draw_sprites', 'draw_bullets',
+          'draw_hud', 'overlays', 'update']
+# Columns: time between frames (from the clock), each phase and their total
+COLUMNS = ['frame'] + PHASES + ['total']
+
+
+class FrameTimings:
+    # Milliseconds spent on each phase of the most recent frames, held in a
+    # ring buffer (one row per frame). A phase is timed from the previous
+    # mark, so marks are made as each phase ends.
+
+    def __init__(self, size: int = FRAME_TIMINGS_SIZE):
+        self.rows = np.zeros((size, len(COLUMNS)))
+        self.no_of_frames = 0  # ever recorded (row is this modulo size)
+        self.column = {c: i for i, c in enumerate(COLUMNS)}
+        self.current = np.zeros(len(COLUMNS))
+        self.last_mark = perf_counter()
+
+    def __len__(self) -> int:
+        return min(self.no_of_frames, len(self.rows))
+
+    def start_frame(self, dt: float) -> None:
+        self.current[:] = 0
+        self.current[0] = dt
+        self.last_mark = perf_counter()
+
+    def mark(self, phase: str) -> None:
+        now = perf_counter()
+        self.current[self.column[phase]] += (now - self.last_mark) * 1000
+        self.last_mark = now
+
+    def end_frame(self) -> None:
+        self.current[-1] = self.current[1:-1].sum()
+        self.rows[self.no_of_frames % len(self.rows)] = self.current
+        self.no_of_frames += 1
+
+    def get_frames(self) -> np.ndarray:
+        # Recorded rows, oldest first
+        n = len(self)
+        start = self.no_of_frames % len(self.rows) if n == len(self.rows) \
+            else 0
+        return np.roll(self.rows[:n], -start, axis=0)
+
+    def get_percentiles(self) -> Dict[str, List[float]]:
+        if len(self) == 0:
+            return {c: [0.0] * len(PERCENTILES) for c in COLUMNS}
+        values = np.percentile(self.rows[:len(self)], PERCENTILES, axis=0)
+        return {c: values[:, i].tolist() for i, c in enumerate(COLUMNS)}
+
+    def write(self, timings_file: str) -> None:
+        # JSON (with percentiles) if the file name ends in .json, else CSV
+        frames = self.get_frames()
+        if timings_file.endswith('.json'):
+            with open(timings_file, 'w') as f:
+                json.dump({'columns': COLUMNS, 'percentiles': PERCENTILES,
+                           'summary': self.get_percentiles(),
+                           'frames': frames.round(4).tolist()}, f)
+        else:
+            np.savetxt(timings_file, frames, fmt='%.4f', delimiter=',',
+                       header=','.join(COLUMNS), comments='')
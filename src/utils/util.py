@@ -1,16 +1,22 @@
-import random
-from typing import List, Tuple, Optional
+import hashlib
+import io
+import math
+import os
+import re
+from concurrent.futures import Executor, Future
+from typing import Callable, Optional
 
-import numpy as np
 import pygame as pg
 from pygame.mixer import Sound
 from pygame.surface import Surface
 
 from src.utils.direction import Direction, direction_to_angle
+from src.utils.tiles import Size2D, Tiles
 
-Size2D = Tuple[int, int]
-Coords = Tuple[int, int]
-CoordsList = List[Coords]
+SOURCE_IMG = re.compile(r'^([0-9]+)\.png$')  # hand-made for a window width
+# Part of cached images' names; to be raised whenever scaling changes, so
+# that images scaled the old way are not loaded
+SCALE_VERSION = 2
 
 
 def user_quit(event) -> bool:
@@ -20,20 +26,13 @@ def user_quit(event) -> bool:
     return event.type == pg.QUIT or alt_f4
 
 
-def get_next_xy(coords: Coords, direction: Direction, px: int = 1) -> Coords:
-    x = coords[0]
-    y = coords[1]
-
-    if direction == Direction.UP:
-        return x, y - px
-    elif direction == Direction.DOWN:
-        return x, y + px
-    elif direction == Direction.LEFT:
-        return x - px, y
-    elif direction == Direction.RIGHT:
-        return x + px, y
-    else:
-        raise NotImplementedError
+def submit(pool: Optional[Executor], fn: Callable, *args) -> Future:
+    # Run on the pool if there is one, otherwise right away
+    if pool is not None:
+        return pool.submit(fn, *args)
+    future = Future()
+    future.set_result(fn(*args))
+    return future
 
 
 def rotate_image(image: Surface, direction: Direction) -> Surface:
@@ -41,23 +40,54 @@ def rotate_image(image: Surface, direction: Direction) -> Surface:
     return pg.transform.rotate(image, direction_to_angle(direction))
 
 
-class Util:
+def get_scaled_size(size: Size2D, factor: float) -> Size2D:
+    # Height rounded down (so that sprites stay within their tiles, which
+    # may not be whole pixels) and width in proportion to it (so that
+    # sprite sheets keep square frames)
+    width, height = size
+    scaled_height = max(1, math.floor(round(height * factor, 6)))
+    return max(1, round(width * scaled_height / height)), scaled_height
 
-    def __init__(self, game_size_pixels: Size2D, game_size_tiles: Size2D,
-                 img_folder: str, sfx_folder: str):
-        self.width_px = game_size_pixels[0]
-        self.height_px = game_size_pixels[1]
-        self.center_px = int(self.width_px / 2), int(self.height_px / 2)
 
-        self.tiles_x = game_size_tiles[0]
-        self.tiles_y = game_size_tiles[1]
+def write_cache_file(cache_path: str, write: Callable[[str], None]) -> None:
+    # Written under a temporary name first, so that a game starting
+    # meanwhile never reads a partly written file; failing only costs
+    # redoing the work next time
+    temp_path = '{}.{}{}'.format(cache_path, os.getpid(),
+                                 os.path.splitext(cache_path)[1])
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        write(temp_path)
+        os.replace(temp_path, cache_path)
+    except (OSError, pg.error):
+        pass
 
-        self.tile_width_px = self.width_px / self.tiles_x
-        self.tile_height_px = self.height_px / self.tiles_y
 
-        self.width_img_name = str(self.width_px) + '.png'
+class Util(Tiles):
+
+    def __init__(self, game_size_pixels: Size2D, game_size_tiles: Size2D,
+                 img_folder: str, sfx_folder: str,
+                 img_cache_folder: Optional[str] = None,
+                 view_size_tiles: Optional[Size2D] = None):
+        # The view (game_size_pixels on screen) shows view_size_tiles of
+        # the board at a time, or all of it if not given or if it fits, so
+        # the board itself is as many pixels as its tiles take up
+        view_size_tiles = view_size_tiles or game_size_tiles
+        self.view_tiles_x = min(view_size_tiles[0], game_size_tiles[0])
+        self.view_tiles_y = min(view_size_tiles[1], game_size_tiles[1])
+        self.view_width_px, self.view_height_px = game_size_pixels
+        super().__init__(
+            (round(self.view_width_px * game_size_tiles[0] /
+                   self.view_tiles_x),
+             round(self.view_height_px * game_size_tiles[1] /
+                   self.view_tiles_y)),
+            game_size_tiles)
+
+        # Images are made for the view's width
+        self.width_img_name = str(self.view_width_px) + '.png'
         self.img_folder = img_folder
         self.sfx_folder = sfx_folder
+        self.img_cache_folder = img_cache_folder  # for rescaled images
 
     def get_sfx_path(self, file: str) -> str:
         return self.sfx_folder + file
@@ -65,8 +95,49 @@ class Util:
     def load_img(self, img_path: str) -> Surface:
         return pg.image.load(self.img_folder + img_path)
 
+    def get_img_source_path(self, folder: str) -> str:
+        # Hand-made image for this window width if there is one, otherwise
+        # the largest one (to be rescaled)
+        img_path = self.img_folder + folder + self.width_img_name
+        if os.path.exists(img_path):
+            return img_path
+        source_width = max(int(m.group(1)) for m in map(
+            SOURCE_IMG.match, os.listdir(self.img_folder + folder)) if m)
+        return self.img_folder + folder + str(source_width) + '.png'
+
     def load_img_from_folder(self, folder: str) -> Surface:
-        return pg.image.load(self.img_folder + folder + self.width_img_name)
+        source_path = self.get_img_source_path(folder)
+        if source_path == self.img_folder + folder + self.width_img_name:
+            return pg.image.load(source_path)
+        return self.load_scaled_img(folder, source_path)
+
+    def load_scaled_img(self, folder: str, source_path: str) -> Surface:
+        # Rescaled images are saved to the cache folder (if there is one)
+        # under the width, the scaling version and a hash of the image they
+        # were scaled from, so scaling is only done on the first launch at a
+        # new width
+        with open(source_path, 'rb') as f:
+            source_data = f.read()
+
+        cache_path = None
+        if self.img_cache_folder is not None:
+            cache_path = '{}{}{}-v{}-{}.png'.format(
+                self.img_cache_folder, folder, self.view_width_px,
+                SCALE_VERSION, hashlib.sha1(source_data).hexdigest()[:16])
+            if os.path.exists(cache_path):
+                return pg.image.load(cache_path)
+
+        source = pg.image.load(io.BytesIO(source_data), source_path)
+        source_width = int(SOURCE_IMG.match(
+            os.path.basename(source_path)).group(1))
+        size = get_scaled_size(source.get_size(),
+                               self.view_width_px / source_width)
+        scaled = pg.transform.smoothscale(source, size)
+
+        if cache_path is not None:
+            write_cache_file(cache_path,
+                             lambda path: pg.image.save(scaled, path))
+        return scaled
 
     def load_sfx(self, sfx: str, as_music: bool = False) -> Optional[Sound]:
         if as_music:
@@ -74,52 +145,3 @@ class Util:
             return None
         else:
             return pg.mixer.Sound(self.get_sfx_path(sfx))
-
-    def get_xy(self, tile: Coords) -> Coords:
-        adjusted_x = tile[0] * self.tile_width_px
-        adjusted_y = tile[1] * self.tile_height_px
-        return int(adjusted_x), int(adjusted_y)
-
-    def get_xy_center(self, tile: Coords) -> Coords:
-        adjusted_x = (tile[0] * self.tile_width_px) + (self.tile_width_px / 2)
-        adjusted_y = (tile[1] * self.tile_height_px) + (self.tile_height_px / 2)
-        return int(adjusted_x), int(adjusted_y)
-
-    def is_xy_out_of_screen(self, xy: Coords) -> bool:
-        return xy[0] < 0 or xy[0] > self.width_px or \
-               xy[1] < 0 or xy[1] > self.height_px
-
-    def get_xy_tile(self, xy: Coords) -> Coords:
-        return int(xy[0] / self.tile_width_px), \
-               int(xy[1] / self.tile_height_px)
-
-    def get_random_tile(self) -> Coords:
-        return (random.randint(0, self.tiles_x - 1),
-                random.randint(0, self.tiles_y - 1))
-
-    def get_random_tile_not_taken(self, taken: np.ndarray) -> Coords:
-        while True:
-            tile = self.get_random_tile()
-            if not taken[tile[0]][tile[1]]:
-                return tile
-
-    def get_next_tile(self, coords: Coords, direction: Direction) -> Coords:
-        x = coords[0]
-        y = coords[1]
-
-        if direction == Direction.UP:
-            newX = x
-            newY = (y + (self.tiles_y - 1)) % self.tiles_y
-        elif direction == Direction.DOWN:
-            newX = x
-            newY = (y + 1) % self.tiles_y
-        elif direction == Direction.LEFT:
-            newX = (x + (self.tiles_x - 1)) % self.tiles_x
-            newY = y
-        elif direction == Direction.RIGHT:
-            newX = (x + 1) % self.tiles_x
-            newY = y
-        else:
-            raise NotImplementedError
-
-        return newX, newY
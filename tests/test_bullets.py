@@ -0,0 +1,73 @@
+import unittest
+
+from src.events import Event
+from src.game import Game, OBJ_ENEMY
+from src.utils.config import Config, Player
+from src.utils.tiles import Tiles
+
+TILES_X = 30
+TILES_Y = 30
+GAME_SIZE_PX = 900
+SHOOT_KEY = 1006
+DTS = [8, 16, 33]  # ms per tick
+PHASES = 84  # idle ticks before firing (covers every snake move phase)
+TICKS_AFTER = 40  # ticks checked after firing
+
+
+def get_config() -> Config:
+    cfg = Config('')
+    cfg.players = [Player('Player 1', {1000}, {1001}, {1002}, {1003},
+                          {1004}, {1005}, {SHOOT_KEY})]
+    cfg.all_keys = cfg.players[0].all_keys
+    return cfg
+
+
+class BulletTest(unittest.TestCase):
+    def get_game(self, dt: int, phase: int) -> Game:
+        # Moving snake with bullets, not a ghost (as at the start of a game)
+        # so that bullets can hit it
+        tiles = Tiles((GAME_SIZE_PX, GAME_SIZE_PX), (TILES_X, TILES_Y))
+        game = Game(tiles, get_config(), (TILES_X, TILES_Y), 1)
+        snake = game.live_snakes[0]
+        snake.add_bullets(10)
+        snake.set_ghost(0)
+        for _ in range(phase):
+            game.step(dt)
+        return game
+
+    def test_firing_straight_ahead_misses_own_snake(self):
+        for dt in DTS:
+            for phase in range(PHASES):
+                game = self.get_game(dt, phase)
+                events = game.step(dt, [(SHOOT_KEY, True)])
+                for _ in range(TICKS_AFTER):
+                    self.assertNotIn(Event.BULLET_HIT_SNAKE, events,
+                                     (dt, phase))
+                    self.assertNotIn(Event.SHIELD_OFF, events, (dt, phase))
+                    events = game.step(dt)
+
+    def test_skull_ahead_is_hit(self):
+        for dt in DTS:
+            for phase in range(PHASES):
+                game = self.get_game(dt, phase)
+                snake = game.live_snakes[0]
+                tile = snake.head
+                for _ in range(2):
+                    tile = game.util.get_next_tile(
+                        tile, snake.last_direction_moved)
+                if game.occupancy[tile] > 0:
+                    continue
+                game.objects[tile] = OBJ_ENEMY
+                game.occupy(tile)
+                game.enemies.append(tile)
+
+                events = game.step(dt, [(SHOOT_KEY, True)])
+                for _ in range(TICKS_AFTER):
+                    if Event.BULLET_HIT_SKULL in events:
+                        break
+                    events = game.step(dt)
+                self.assertNotIn(tile, game.enemies, (dt, phase))
+
+
+if __name__ == '__main__':
+    unittest.main()